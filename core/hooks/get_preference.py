@@ -12,6 +12,9 @@
 Hook which looks up a DD Preference value.
 """
 
+import os
+import time
+
 import sgtk
 HookBaseClass = sgtk.get_hook_baseclass()
 
@@ -24,6 +27,19 @@ import preferences
 import logging
 preferences.logger.setLevel(logging.INFO)
 
+# Preferences instance shared by all the lookups, with the DD environment it was resolved in,
+# and the time it was resolved at
+PREFERENCES_INSTANCE = {"prefs": None, "environment": None, "time": 0.0}
+
+# seconds before the Preferences instance is resolved again, to pick up preference changes
+PREFERENCES_INSTANCE_TTL = 300
+
+# resolved values, keyed by (bundle name, setting, settings type, extra params)
+PREFERENCE_VALUES = dict()
+
+# time spent in preference lookups, logged whenever the Preferences instance is resolved again
+PREFERENCE_LOOKUP_STATS = {"calls": 0, "hits": 0, "seconds": 0.0}
+
 
 class GetPreference(HookBaseClass):
 
@@ -31,9 +47,26 @@ class GetPreference(HookBaseClass):
         """
         Uses the Preferences system to lookup a value for the passed in key
         """
+        start_time = time.time()
+        try:
+            return self._get_value(setting, settings_type, bundle_obj, extra_params)
+        finally:
+            PREFERENCE_LOOKUP_STATS["calls"] += 1
+            PREFERENCE_LOOKUP_STATS["seconds"] += time.time() - start_time
+
+    def _get_value(self, setting, settings_type, bundle_obj, extra_params):
+        """
+        Returns the value for the passed in key, resolved once until the Preferences instance is resolved again.
+        """
+        prefs = self._get_preferences()
+
+        cache_key = (bundle_obj.name, setting, settings_type, tuple(extra_params))
+        if cache_key in PREFERENCE_VALUES:
+            PREFERENCE_LOOKUP_STATS["hits"] += 1
+            return PREFERENCE_VALUES[cache_key]
+
         key = '%s.%s' % (bundle_obj.name, setting)
         default = dict(enumerate(extra_params)).get(0, None)
-        prefs = preferences.Preferences(package="sgtk_config")
 
         value = prefs.get(key, default)
         if settings_type == "int":
@@ -43,4 +76,25 @@ class GetPreference(HookBaseClass):
         elif settings_type == "str":
             value = str(value)
 
+        PREFERENCE_VALUES[cache_key] = value
         return value
+
+    def _get_preferences(self):
+        """
+        Returns the shared Preferences instance, created again when the DD environment
+        (show, sequence, shot...) changes, or after PREFERENCES_INSTANCE_TTL seconds.
+        The resolved values are cleared along with it.
+        """
+        environment = tuple(sorted((key, value) for key, value in os.environ.iteritems() if key.startswith("DD_")))
+
+        if PREFERENCES_INSTANCE["prefs"] is None or PREFERENCES_INSTANCE["environment"] != environment or \
+                time.time() - PREFERENCES_INSTANCE["time"] >= PREFERENCES_INSTANCE_TTL:
+            if PREFERENCE_LOOKUP_STATS["calls"]:
+                self.logger.debug("Preference lookups: %(calls)d calls, %(hits)d cache hits, %(seconds).3fs."
+                                  % PREFERENCE_LOOKUP_STATS)
+
+            PREFERENCES_INSTANCE.update(prefs=preferences.Preferences(package="sgtk_config"),
+                                        environment=environment, time=time.time())
+            PREFERENCE_VALUES.clear()
+
+        return PREFERENCES_INSTANCE["prefs"]
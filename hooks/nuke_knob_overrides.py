@@ -0,0 +1,80 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Hook that applies the NukePreferences knob overrides of a pipeline step to the nodes created by the actions.
+It sits between the app actions hook and the engine specific actions hook of the loader and the shotgun panel.
+"""
+import os
+import time
+
+import sgtk
+
+from code.nuke_preferences import NukePreferences
+
+HookBaseClass = sgtk.get_hook_baseclass()
+
+# compiled knob overrides, keyed by (pipeline step, DD environment)
+# each entry holds the time it was compiled at, and the overrides keyed by node class
+KNOB_OVERRIDE_TABLES = dict()
+
+# seconds before the knob overrides of a step are compiled again, to pick up preference changes
+KNOB_OVERRIDE_TABLES_TTL = 300
+
+
+class NukeKnobOverrides(HookBaseClass):
+    """
+    Knob override helpers for the Nuke actions.
+    """
+
+    def _get_knob_overrides(self, step):
+        """Helper method to get the knob overrides of a pipeline step, keyed by node class.
+
+        The overrides are compiled once per step and DD environment (show, sequence, shot...),
+        and compiled again after KNOB_OVERRIDE_TABLES_TTL seconds.
+
+        Args:
+            step (str): Pipeline step short name.
+
+        Returns:
+            dict: Node class to a list of (knob name, knob value) tuples.
+        """
+        environment = tuple(sorted((key, value) for key, value in os.environ.iteritems() if key.startswith("DD_")))
+        cache_key = (step, environment)
+
+        cached = KNOB_OVERRIDE_TABLES.get(cache_key)
+        if cached:
+            compile_time, overrides = cached
+            if time.time() - compile_time < KNOB_OVERRIDE_TABLES_TTL:
+                return overrides
+
+        nuke_prefs = NukePreferences(step)
+
+        # knob names are of the form <node class>.<knob>
+        overrides = dict()
+        for knob_name, knob_value in nuke_prefs.getKnobOverridesGenerator(step):
+            node_class, _, knob = knob_name.partition(".")
+            if knob:
+                overrides.setdefault(node_class, []).append((knob, knob_value))
+
+        KNOB_OVERRIDE_TABLES[cache_key] = (time.time(), overrides)
+        return overrides
+
+    def _apply_knob_overrides(self, node, step):
+        """Helper method to apply the knob overrides of a pipeline step to a node.
+
+        Args:
+            node (nuke.Node): Node to apply the overrides to.
+            step (str): Pipeline step short name.
+        """
+        import nuke
+
+        for knob, knob_value in self._get_knob_overrides(step).get(node.Class(), []):
+            nuke.knob("{}.{}".format(node.name(), knob), knob_value)
@@ -8,11 +8,20 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import time
+from collections import OrderedDict
+
 import hiero
 import sgtk
 
 HookBaseClass = sgtk.get_hook_baseclass()
 
+# seconds a cached shot stays valid
+SHOT_CACHE_TTL = 300
+
+# maximum number of cached shots, the least recently used ones are evicted first
+SHOT_CACHE_SIZE = 2000
+
 
 class HieroResolveCustomStrings(HookBaseClass):
     """
@@ -21,8 +30,12 @@ class HieroResolveCustomStrings(HookBaseClass):
     """
     RESOLUTION_TOKEN_NAMES = ("width", "height")
 
-    # Cache of shots that have already been pulled from shotgun
-    _sg_lookup_cache = {}
+    # Cache of shots that have already been pulled from shotgun,
+    # keyed by (project id, sequence name, shot code), with the time they were cached
+    _sg_lookup_cache = OrderedDict()
+
+    # Sequences whose shots were prefetched, keyed by (project id, sequence name), with the prefetch time
+    _prefetched_sequences = {}
 
     def execute(self, task, keyword, **kwargs):
         """
@@ -48,11 +61,18 @@ class HieroResolveCustomStrings(HookBaseClass):
 
         else:
             shot_code = task._item.name()
+            project_id = self._get_project_id()
+            sequence = getattr(task, "_sequence", None)
+            sequence_name = sequence.name() if sequence else None
+            fields = [ctf['keyword'] for ctf in self.parent.get_setting('custom_template_fields')]
+
+            # fetch the shots of the whole sequence with a single query
+            self._prefetch_sequence_shots(task, project_id, fields)
 
             # grab the shot from the cache, or the get_shot hook if not cached
-            sg_shot = self._sg_lookup_cache.get(shot_code)
+            cache_key = (project_id, sequence_name, shot_code)
+            sg_shot = self._get_cached_shot(cache_key)
             if sg_shot is None:
-                fields = [ctf['keyword'] for ctf in self.parent.get_setting('custom_template_fields')]
                 sg_shot = self.parent.execute_hook(
                     "hook_get_shot",
                     task=task,
@@ -62,7 +82,7 @@ class HieroResolveCustomStrings(HookBaseClass):
                     upload_thumbnail=False,
                 )
 
-                self._sg_lookup_cache[shot_code] = sg_shot
+                self._cache_shot(cache_key, sg_shot)
 
             if sg_shot is None:
                 raise RuntimeError("Could not find shot for custom resolver: %s" % keyword)
@@ -72,6 +92,89 @@ class HieroResolveCustomStrings(HookBaseClass):
 
         return str(result)
 
+    def _get_project_id(self):
+        """
+        Returns the id of the Shotgun project being exported to, None if there is none.
+        """
+        project = self.parent.context.project
+        return project["id"] if project else None
+
+    def _get_cached_shot(self, cache_key):
+        """
+        Returns a cached shot, None if it isn't cached or expired.
+        """
+        cached = self._sg_lookup_cache.pop(cache_key, None)
+        if cached is None:
+            return None
+
+        cached_time, sg_shot = cached
+        if time.time() - cached_time > SHOT_CACHE_TTL:
+            return None
+
+        # most recently used shots go last
+        self._sg_lookup_cache[cache_key] = cached
+        return sg_shot
+
+    def _cache_shot(self, cache_key, sg_shot):
+        """
+        Caches a shot, evicting the least recently used shots when the cache is full.
+        """
+        if sg_shot is None:
+            return
+
+        self._sg_lookup_cache.pop(cache_key, None)
+        self._sg_lookup_cache[cache_key] = (time.time(), sg_shot)
+        while len(self._sg_lookup_cache) > SHOT_CACHE_SIZE:
+            self._sg_lookup_cache.popitem(last=False)
+
+    def _prefetch_sequence_shots(self, task, project_id, fields):
+        """
+        Fetches the shots of all the track items of the sequence being exported, with a single query.
+        Like the get_shot hook, shots are matched in the Shotgun Sequence with the name of the Hiero sequence.
+        Shot codes matching more than one shot are left to the get_shot hook, as well as all the shots
+        if the query fails.
+        """
+        sequence = getattr(task, "_sequence", None)
+        if not sequence or project_id is None:
+            return
+
+        prefetch_key = (project_id, sequence.name())
+        prefetch_time = self._prefetched_sequences.get(prefetch_key)
+        if prefetch_time and time.time() - prefetch_time < SHOT_CACHE_TTL:
+            return
+
+        shot_codes = set()
+        for track in sequence.videoTracks():
+            for track_item in track.items():
+                shot_codes.add(track_item.name())
+
+        if not shot_codes:
+            self._prefetched_sequences[prefetch_key] = time.time()
+            return
+
+        filters = [
+            ["project", "is", {"type": "Project", "id": project_id}],
+            ["sg_sequence.Sequence.code", "is", sequence.name()],
+            ["code", "in", list(shot_codes)],
+        ]
+        try:
+            sg_shots = self.parent.shotgun.find("Shot", filters, list(set(fields + ["code"])))
+        except Exception as e:
+            # the sequence is prefetched again for the next keyword
+            self.parent.log_debug("Failed to prefetch the shots of sequence %s: %s" % (sequence.name(), e))
+            return
+        self._prefetched_sequences[prefetch_key] = time.time()
+
+        shots_by_code = {}
+        for sg_shot in sg_shots:
+            shots_by_code.setdefault(sg_shot["code"], []).append(sg_shot)
+
+        for shot_code, matching_shots in shots_by_code.iteritems():
+            if len(matching_shots) == 1:
+                self._cache_shot((project_id, sequence.name(), shot_code), matching_shots[0])
+
+        self.parent.log_debug("Prefetched %d shots of sequence %s" % (len(shots_by_code), sequence.name()))
+
     def get_height(self, task):
         """
         """
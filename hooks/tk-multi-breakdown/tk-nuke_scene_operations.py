@@ -15,13 +15,16 @@ import sgtk
 
 HookBaseClass = sgtk.get_hook_baseclass()
 
+# node classes with a file knob handled by the breakdown
+FILE_NODE_CLASSES = ("Read", "DeepRead", "ReadGeo2", "Camera2")
+
 
 class BreakdownSceneOperations(HookBaseClass):
     """
     Breakdown operations for Nuke.
 
-    This implementation handles detection of Nuke read nodes,
-    geometry nodes and camera nodes.
+    This implementation handles detection of Nuke read nodes, deep read nodes,
+    geometry nodes and camera nodes, including the ones inside groups.
     """
 
     def scan_scene(self):
@@ -81,29 +84,18 @@ class BreakdownSceneOperations(HookBaseClass):
         if self.parent.engine.studio_enabled or self.parent.engine.hiero_enabled:
             return reads
 
-        # first let's look at the read nodes
-        for node in nuke.allNodes("Read"):
-            node_name = node.name()
+        # all the file nodes are collected in a single pass, including the ones inside groups
+        for node in nuke.allNodes(recurseGroups=True):
+            node_class = node.Class()
+            if node_class not in FILE_NODE_CLASSES:
+                continue
 
+            node_name = node.fullName()
             # note! We are getting the "abstract path", so contains
             # %04d and %V rather than actual values.
             path = node.knob('file').value().replace("/", os.path.sep)
 
-            reads.append({"node": node_name, "type": "Read", "path": path})
-
-        # then the read geometry nodes
-        for node in nuke.allNodes("ReadGeo2"):
-            node_name = node.name()
-
-            path = node.knob('file').value().replace("/", os.path.sep)
-            reads.append({"node": node_name, "type": "ReadGeo2", "path": path})
-
-        # then the read camera nodes
-        for node in nuke.allNodes("Camera2"):
-            node_name = node.name()
-
-            path = node.knob('file').value().replace("/", os.path.sep)
-            reads.append({"node": node_name, "type": "Camera2", "path": path})
+            reads.append({"node": node_name, "type": node_class, "path": path})
 
         return reads
 
@@ -120,14 +112,12 @@ class BreakdownSceneOperations(HookBaseClass):
         """
         engine = self.parent.engine
 
-        node_type_list = ["Read", "ReadGeo2", "Camera2", "DeepRead"]
-
         for i in items:
             node_name = i["node"]
             node_type = i["type"]
             new_path = i["path"].replace(os.path.sep, "/")
 
-            if node_type in node_type_list:
+            if node_type in FILE_NODE_CLASSES:
                 engine.log_debug("Node %s: Updating to version %s" % (node_name, new_path))
                 node = nuke.toNode(node_name)
                 node.knob("file").setValue(new_path)
@@ -0,0 +1,148 @@
+# Copyright (c) 2017 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Hook that resolves templates from paths for the loader actions.
+It sits between the app actions hook and the engine specific actions hook of this config.
+"""
+import os
+import re
+import threading
+
+import sgtk
+from sgtk import TankError
+
+HookBaseClass = sgtk.get_hook_baseclass()
+
+# everything in a template definition after the first key or optional section is dynamic
+DYNAMIC_DEFINITION_REGEX = re.compile(r"[\[{]")
+
+# maximum number of paths with memoized fields
+FIELDS_CACHE_SIZE = 10000
+
+# template index, shared by all the loader hooks of the session
+TEMPLATE_INDEX = {
+    "templates": None,
+    # static path prefix to templates
+    "prefixes": dict(),
+    # directory to the templates whose static prefix is a parent of it
+    "directories": dict(),
+    # path to (template, fields)
+    "fields": dict(),
+    # (environment name, template expression) to template
+    "expressions": dict(),
+}
+TEMPLATE_INDEX_LOCK = threading.Lock()
+
+
+class LoaderTemplateResolver(HookBaseClass):
+    """
+    Template resolution helpers for the loader actions.
+    """
+
+    def _get_template_index(self):
+        """
+        Returns the template index, built again whenever the templates of the pipeline configuration change.
+
+        :returns: Template index dictionary.
+        """
+        templates = self.parent.sgtk.templates
+
+        with TEMPLATE_INDEX_LOCK:
+            if TEMPLATE_INDEX["templates"] is not templates:
+                prefixes = dict()
+                for template in templates.itervalues():
+                    if not isinstance(template, sgtk.TemplatePath):
+                        continue
+                    static_definition = DYNAMIC_DEFINITION_REGEX.split(template.definition, 1)[0]
+                    # only the complete directories are static, the last token can be part of a name
+                    static_dir = os.path.dirname(static_definition)
+                    prefix = os.path.normpath(os.path.join(template.root_path, static_dir))
+                    prefixes.setdefault(prefix, []).append(template)
+
+                TEMPLATE_INDEX["templates"] = templates
+                TEMPLATE_INDEX["prefixes"] = prefixes
+                TEMPLATE_INDEX["directories"] = dict()
+                TEMPLATE_INDEX["fields"] = dict()
+                TEMPLATE_INDEX["expressions"] = dict()
+
+        return TEMPLATE_INDEX
+
+    def _get_template_and_fields(self, path):
+        """
+        Finds the template that matches the path, and the fields extracted from the path.
+        The results are memoized per path, and the candidate templates per directory.
+        Every candidate is tested, so that overlapping templates are always reported.
+
+        :param path: Path to match against the templates.
+        :returns: Tuple of (template, fields), (None, None) if no template matches.
+        :raises TankError: If the path matches more than one template.
+        """
+        index = self._get_template_index()
+        path = os.path.normpath(path)
+
+        if path in index["fields"]:
+            template, fields = index["fields"][path]
+            return template, dict(fields) if fields else fields
+
+        directory = os.path.dirname(path)
+        candidates = index["directories"].get(directory)
+        if candidates is None:
+            candidates = list(self._get_candidate_templates(index, path))
+
+        matches = [candidate for candidate in candidates if candidate.validate(path)]
+        if len(matches) > 1:
+            raise TankError("%d templates are matching the path '%s'! The overlapping templates are:\n%s" %
+                            (len(matches), path, "\n".join(str(match) for match in matches)))
+        template = matches[0] if matches else None
+
+        result = (template, template.get_fields(path) if template else None)
+
+        with TEMPLATE_INDEX_LOCK:
+            index["directories"][directory] = candidates
+            if len(index["fields"]) >= FIELDS_CACHE_SIZE:
+                index["fields"].clear()
+            index["fields"][path] = result
+
+        return template, dict(result[1]) if result[1] else result[1]
+
+    @staticmethod
+    def _get_candidate_templates(index, path):
+        """
+        Yields the templates whose static prefix is a parent directory of the path.
+
+        :param index: Template index dictionary.
+        :param path: Normalized path.
+        """
+        directory = os.path.dirname(path)
+        while True:
+            for template in index["prefixes"].get(directory, []):
+                yield template
+            parent_directory = os.path.dirname(directory)
+            if parent_directory == directory:
+                break
+            directory = parent_directory
+
+    def _get_expression_template(self, template_expression):
+        """
+        Resolves a template setting expression, eg. "{env_name}_proxy_image", to a template.
+        The resolved templates are cached per environment.
+
+        :param template_expression: Template name expression.
+        :returns: Tuple of (template name, template), the template is None if it doesn't exist.
+        """
+        index = self._get_template_index()
+        cache_key = (self.parent.engine.environment["name"], template_expression)
+
+        if cache_key not in index["expressions"]:
+            template_name = self.parent.resolve_setting_expression(template_expression)
+            index["expressions"][cache_key] = (template_name, self.parent.sgtk.templates.get(template_name))
+
+        return index["expressions"][cache_key]
@@ -234,19 +234,15 @@ class CustomMariActions(HookBaseClass):
         ref_image_missing = []
 
         try:
-            template = self.parent.sgtk.template_from_path(path)
+            template, fields = self._get_template_and_fields(path)
         except sgtk.TankError:
             pass
         if not template:
             return None
 
-        # get the fields
-        fields = template.get_fields(path)
-
         # get metadata template
         metadata_template_exp = "{env_name}_publish_metadata"
-        metadata_template_name = self.parent.resolve_setting_expression(metadata_template_exp)
-        metadata_template = self.parent.sgtk.templates.get(metadata_template_name)
+        metadata_template_name, metadata_template = self._get_expression_template(metadata_template_exp)
 
         if not metadata_template:
             self.parent.logger.warning("Unable to find metadata template: {}".format(metadata_template_name))
@@ -15,6 +15,7 @@ import sgtk
 import os
 import re
 import glob
+from multiprocessing.pool import ThreadPool
 
 import hiero
 from hiero.core import (
@@ -28,10 +29,36 @@ from hiero.core import (
     VideoTrack
 )
 
-from code.nuke_preferences import NukePreferences
-
 HookBaseClass = sgtk.get_hook_baseclass()
 
+# pipeline step short names, keyed by task id, shared by all the loads of the session
+TASK_STEP_SHORT_NAMES = dict()
+
+# file extensions loaded with a ReadGeo2 node
+GEO_READ_EXTENSIONS = [".abc", ".obj", ".fbx"]
+
+# file extensions loaded with a Read node
+READ_NODE_EXTENSIONS = [".png",
+                        ".jpg",
+                        ".jpeg",
+                        ".exr",
+                        ".cin",
+                        ".dpx",
+                        ".tiff",
+                        ".tif",
+                        ".mov",
+                        ".psd",
+                        ".tga",
+                        ".ari",
+                        ".gif",
+                        ".iff"]
+
+# number of threads resolving the publishes of a batch load
+BATCH_LOAD_WORKERS = 8
+
+# horizontal spacing between the Read nodes of a batch load
+BATCH_LOAD_NODE_SPACING = 120
+
 class CustomNukeActions(HookBaseClass):
     """
     Shotgun Panel Actions for Nuke
@@ -140,6 +167,34 @@ class CustomNukeActions(HookBaseClass):
         if name == "clip_import_bin":
             self._import_img_seq(path, sg_publish_data)
 
+    def execute_multiple_actions(self, actions):
+        """
+        Executes the specified action on a list of items.
+
+        The pipeline steps of the whole selection are fetched up front,
+        so that creating the nodes doesn't query Shotgun once per publish.
+
+        Read nodes for a multi-selection are created in a single batch,
+        see :meth:`_create_read_nodes_batch`.
+
+        :param list actions: Action dictionaries, each with name, params and sg_publish_data keys.
+        """
+        self._prefetch_pipe_steps([action["sg_publish_data"] for action in actions])
+
+        read_actions = []
+        other_actions = []
+        for action in actions:
+            if action["name"] == "read_node" and self._is_batch_readable(action["sg_publish_data"]):
+                read_actions.append(action)
+            else:
+                other_actions.append(action)
+
+        if len(read_actions) > 1:
+            self._create_read_nodes_batch([action["sg_publish_data"] for action in read_actions])
+            actions = other_actions
+
+        super(CustomNukeActions, self).execute_multiple_actions(actions)
+
     ##############################################################################################################
     # helper methods which can be subclassed in custom hooks to fine tune the behavior of things
 
@@ -158,8 +213,7 @@ class CustomNukeActions(HookBaseClass):
             raise Exception("An active project must exist to import clips into.")
 
         # get pipeline step from path
-        template = self.parent.sgtk.template_from_path(path)
-        fields = template.get_fields(path)
+        template, fields = self._get_template_and_fields(path)
         department = str(fields["Step"])
 
         # get project dict from path
@@ -224,8 +278,7 @@ class CustomNukeActions(HookBaseClass):
             raise Exception("An active project must exist to import clips into.")
 
         # get pipeline step from path
-        template = self.parent.sgtk.template_from_path(path)
-        fields = template.get_fields(path)
+        template, fields = self._get_template_and_fields(path)
         department = str(fields["Step"])
 
         # set department bin
@@ -291,12 +344,7 @@ class CustomNukeActions(HookBaseClass):
 
         # to fetch the nuke prefs from pipeline
         step = self._find_pipe_step(path, sg_publish_data)
-        nuke_prefs = NukePreferences(step)
-
-        for knob_name, knob_value in nuke_prefs.getKnobOverridesGenerator(step):
-            if read_node.Class() in knob_name:
-                knob_name = knob_name.replace(read_node.Class(), read_node.name())
-                nuke.knob(knob_name, knob_value)
+        self._apply_knob_overrides(read_node, step)
 
         if seq_range:
             # override the detected frame range.
@@ -327,10 +375,8 @@ class CustomNukeActions(HookBaseClass):
         
         (_, ext) = os.path.splitext(path)
 
-        valid_geo_extensions = [".abc", ".obj", ".fbx"]
-
         # If this is an Alembic cache, use a ReadGeo2 and we're done.
-        if ext.lower() in valid_geo_extensions:
+        if ext.lower() in GEO_READ_EXTENSIONS:
             read_geo = nuke.createNode('ReadGeo2')
             # TODO: check issue of alembic with multiple nodes
             # http://community.foundry.com/discuss/topic/103204
@@ -339,22 +385,7 @@ class CustomNukeActions(HookBaseClass):
             self._add_node_metadata(read_geo, path, sg_publish_data)
             return
 
-        valid_extensions = [".png", 
-                            ".jpg", 
-                            ".jpeg", 
-                            ".exr", 
-                            ".cin", 
-                            ".dpx", 
-                            ".tiff", 
-                            ".tif", 
-                            ".mov", 
-                            ".psd",
-                            ".tga",
-                            ".ari",
-                            ".gif",
-                            ".iff"]
-
-        if ext.lower() not in valid_extensions:
+        if ext.lower() not in READ_NODE_EXTENSIONS:
             raise Exception("Unsupported file extension for '%s'!" % path)
 
         # `nuke.createNode()` will extract the format from the
@@ -373,12 +404,7 @@ class CustomNukeActions(HookBaseClass):
 
         # to fetch the nuke prefs from pipeline
         step = self._find_pipe_step(path, sg_publish_data)
-        nuke_prefs = NukePreferences(step)
-
-        for knob_name, knob_value in nuke_prefs.getKnobOverridesGenerator(step):
-            if read_node.Class() in knob_name:
-                knob_name = knob_name.replace(read_node.Class(), read_node.name())
-                nuke.knob(knob_name, knob_value)
+        self._apply_knob_overrides(read_node, step)
 
         if seq_range:
             # override the detected frame range.
@@ -398,41 +424,149 @@ class CustomNukeActions(HookBaseClass):
         # add the SGTK metadata on the node
         self._add_node_metadata(read_node, path, sg_publish_data)
 
-    def _get_proxy_path(self, path):
+    def _is_batch_readable(self, sg_publish_data):
+        """
+        Checks whether a publish can be loaded as part of a batch of Read nodes.
+
+        :param sg_publish_data: Shotgun data dictionary with all the standard publish fields.
+        :returns: True if the publish is loaded with a Read node, False otherwise.
+        """
+        path = self.get_publish_path(sg_publish_data)
+        (_, ext) = os.path.splitext(path)
+        return ext.lower() in READ_NODE_EXTENSIONS
+
+    def _resolve_read_node_data(self, publish):
+        """
+        Resolves everything needed to create a Read node for a publish, without touching the nuke script.
+        This runs in a worker thread, so nothing is logged here, the warnings are returned instead.
+
+        :param publish: Tuple of (path, Shotgun data dictionary with all the standard publish fields)
+        :returns: Tuple of (sequence range, proxy path, pipeline step, list of warnings)
+        """
+        path, sg_publish_data = publish
+        warnings = list()
+        seq_range = self.parent.utils.find_sequence_range(self.sgtk, path)
+        proxy_path = self._get_proxy_path(path, warnings)
+        step = self._find_pipe_step(path, sg_publish_data)
+        return seq_range, proxy_path, step, warnings
+
+    def _create_read_nodes_batch(self, sg_publish_data_list):
+        """
+        Create read nodes representing many publishes at once.
+
+        The paths, sequence ranges, proxies and steps of all the publishes are resolved concurrently
+        up front, then the nodes are created with explicit range values, lined up in the node graph.
+
+        :param sg_publish_data_list: Shotgun data dictionaries with all the standard publish fields.
+        """
+        import nuke
+
+        # the hooks and the settings are only used from the main thread, the workers get what they need.
+        paths = [self.get_publish_path(sg_publish_data).decode("utf-8") for sg_publish_data in sg_publish_data_list]
+        self._get_expression_template("{env_name}_proxy_image")
+
+        pool = ThreadPool(min(BATCH_LOAD_WORKERS, len(sg_publish_data_list)))
+        try:
+            read_node_data = pool.map(self._resolve_read_node_data, zip(paths, sg_publish_data_list))
+        finally:
+            pool.close()
+            pool.join()
+
+        (xpos, ypos) = nuke.center()
+        for index, (sg_publish_data, path, (seq_range, proxy_path, step, warnings)) in enumerate(
+                zip(sg_publish_data_list, paths, read_node_data)):
+            for warning in warnings:
+                self.parent.logger.warning(warning)
+
+            read_node = nuke.nodes.Read()
+            read_node.setXYpos(int(xpos) + index * BATCH_LOAD_NODE_SPACING, int(ypos))
+
+            # fromUserText() extracts the format from the file, whereas setValue() doesn't.
+            if seq_range:
+                # the range is known, passing it explicitly avoids detecting it from the files
+                read_node["file"].fromUserText("{} {}-{}".format(path, seq_range[0], seq_range[1]))
+            else:
+                read_node["file"].fromUserText(path)
+                self.parent.logger.warning("{}: Not setting frame range.".format(read_node.name()))
+
+            self._apply_knob_overrides(read_node, step)
+
+            if proxy_path:
+                read_node["proxy"].fromUserText(proxy_path)
+            else:
+                self.parent.logger.warning("{}: Not setting proxy path.".format(read_node.name()))
+
+            # add the SGTK metadata on the node
+            self._add_node_metadata(read_node, path, sg_publish_data)
+
+        self.parent.logger.info("Created %d Read nodes." % len(sg_publish_data_list))
+
+    def _get_proxy_path(self, path, warnings=None):
+        """
+        Finds the proxy path of a path, using the proxy template of the environment.
+
+        :param path: Path to find the proxy path for.
+        :param warnings: Optional list, the warnings are added to it instead of being logged.
+        :returns: Proxy path, None if it can't be resolved.
+        """
+        warn = warnings.append if warnings is not None else self.parent.logger.warning
+
         # TODO: use sg_publish_data to find associated file tagged as "proxy" instead
         # find a template that matches the path:
         template = None
         try:
-            template = self.parent.sgtk.template_from_path(path)
+            template, fields = self._get_template_and_fields(path)
         except sgtk.TankError:
             pass
         if not template:
             return None
 
-        # get the fields
-        fields = template.get_fields(path)
-
         # get proxy template
         proxy_template_exp = "{env_name}_proxy_image"
-        proxy_template_name = self.parent.resolve_setting_expression(proxy_template_exp)
-        proxy_template = self.parent.sgtk.templates.get(proxy_template_name)
+        proxy_template_name, proxy_template = self._get_expression_template(proxy_template_exp)
 
         if not proxy_template:
-            self.parent.logger.warning("Unable to find proxy template: {}".format(proxy_template_name))
+            warn("Unable to find proxy template: {}".format(proxy_template_name))
             return None
 
         try:
             proxy_path = proxy_template.apply_fields(fields)
             return proxy_path
         except sgtk.TankError:
-            self.parent.logger.warning("Unable to apply fields: {}"
-                                       "\nto proxy template: {}".format(fields, proxy_template_name))
+            warn("Unable to apply fields: {}"
+                 "\nto proxy template: {}".format(fields, proxy_template_name))
             return None
 
+    def _prefetch_pipe_steps(self, sg_publish_data_list):
+        """Helper method to fetch the pipeline steps of many publishes at once.
+
+        The step short names of all the tasks not cached yet are fetched with a single query.
+
+        Args:
+            sg_publish_data_list (list): Shotgun data dictionaries with all the standard publish fields.
+        """
+        task_ids = set()
+        for sg_publish_data in sg_publish_data_list:
+            task = sg_publish_data.get("task")
+            if task and task.get("id") not in TASK_STEP_SHORT_NAMES:
+                task_ids.add(task.get("id"))
+
+        if not task_ids:
+            return
+
+        filters = [["id", "in", list(task_ids)]]
+        fields = ["step.Step.short_name"]
+        for task in self.sgtk.shotgun.find("Task", filters, fields):
+            TASK_STEP_SHORT_NAMES[task["id"]] = task.get("step.Step.short_name")
+
+        # don't query again for tasks which couldn't be found
+        for task_id in task_ids:
+            TASK_STEP_SHORT_NAMES.setdefault(task_id, None)
+
     def _find_pipe_step(self, path, sg_publish_data):
         """Helper method to extract pipeline step from renders.
 
-        By extracting fields from the template path.
+        The step is looked up from the publish task, and cached per task for the session.
         
         Args:
             path (str): File path
@@ -446,24 +580,11 @@ class CustomNukeActions(HookBaseClass):
             return "asset"
         else:
             if sg_publish_data["task"]:
-                entity_type = sg_publish_data["task"].get("type")
-                filters = [["id", "is", sg_publish_data["task"].get("id")]]
-                fields = ["step"]
-                item = self.sgtk.shotgun.find_one(entity_type, filters, fields)
-
-                step = item.get("step", None)
+                task_id = sg_publish_data["task"].get("id")
+                if task_id not in TASK_STEP_SHORT_NAMES:
+                    self._prefetch_pipe_steps([sg_publish_data])
 
-                # fetch the short_name of the task
-                entity_type = step.get("type")
-                filters = [["id", "is", step.get("id")]]
-                fields = ["short_name"]
-
-                step_info = self.sgtk.shotgun.find_one(entity_type, filters, fields)
-
-                if step_info:
-                    return step_info.get("short_name")
-                else:
-                    return None
+                return TASK_STEP_SHORT_NAMES.get(task_id)
 
     def _add_node_metadata(self, node,  path, sg_publish_data):
         """
@@ -10,6 +10,8 @@
 
 import os
 import datetime
+import hashlib
+import cPickle
 import traceback
 import pprint
 import re
@@ -20,10 +22,27 @@ import operator
 
 import sgtk
 import tank
+from sgtk import TankError
+from sgtk.util.filesystem import ensure_folder_exists
 from tank_vendor import yaml
 
 HookBaseClass = sgtk.get_hook_baseclass()
 
+# use the LibYAML based parser when available, it is much faster than the pure python parser.
+if getattr(yaml, "__with_libyaml__", False):
+    class ManifestLoader(yaml.cyaml.CParser, yaml.composer.Composer, yaml.constructor.Constructor,
+                         yaml.resolver.Resolver):
+        """
+        Loader for manifest files, composes nodes from the events emitted by the LibYAML parser.
+        """
+        def __init__(self, stream):
+            yaml.cyaml.CParser.__init__(self, stream)
+            yaml.composer.Composer.__init__(self)
+            yaml.constructor.Constructor.__init__(self)
+            yaml.resolver.Resolver.__init__(self)
+else:
+    ManifestLoader = yaml.Loader
+
 # This is a dictionary of fields in snapshot from manifest and it's corresponding field on the item.
 DEFAULT_MANIFEST_SG_MAPPINGS = {
     "file": {
@@ -64,6 +83,28 @@ DEFAULT_NOTE_TYPES_MAPPINGS = {
 # Default snapshot_type
 DEFAULT_SNAPSHOT_TYPE = "ingest"
 
+# This is a dictionary of manifest sections and the schema every record in that section is validated against.
+MANIFEST_RECORD_SCHEMA = {
+    "snapshots": {
+        "required": {"file_types": dict},
+        "optional": {},
+    },
+    "notes": {
+        "required": {"note_type": basestring, "attachments": list},
+        "optional": {"note_links": list},
+    },
+    "versions": {
+        "required": {},
+        "optional": {},
+    },
+}
+
+# Version of the processed manifest cache, bump this whenever the format of the processed entities changes.
+MANIFEST_CACHE_VERSION = 2
+
+# Number of manifest entities collected at once, tags are resolved in bulk for every chunk.
+MANIFEST_COLLECT_CHUNK_SIZE = 500
+
 # This is a dictionary of note_type values to their access keys in the fields dict.
 DEFAULT_NOTE_TYPES_ACCESS_FALLBACKS = {
     "kickoff": [["sg_version", "original_name"], ["sg_version", "name"],
@@ -183,6 +224,13 @@ class IngestCollectorPlugin(HookBaseClass):
             "default_value": "contents.yaml",
             "description": "Name of the file to look for, as a source for processing files to be ingested."
         }
+        schema["Manifest Cache Size"] = {
+            "type": "int",
+            "allows_empty": True,
+            "default_value": 256,
+            "description": "Maximum size in MB of the on-disk cache of processed manifest files. "
+                           "Least recently used manifests are evicted first, 0 disables the cache."
+        }
         schema["Properties To Display"] = {
             "type": "list",
             "values": {
@@ -219,6 +267,33 @@ class IngestCollectorPlugin(HookBaseClass):
         }
         return schema
 
+    def __init__(self, parent, **kwargs):
+        """
+        Construction
+        """
+        # call base init
+        super(IngestCollectorPlugin, self).__init__(parent, **kwargs)
+
+        # cache of lower case Tag name -> Tag entity, shared by all the manifests collected in this session.
+        # Tag names are matched case insensitively, like the shotgun "in" filter does.
+        self.__tag_entities = dict()
+
+        # lower case names of the Tags that failed to be created, they aren't queried/created again.
+        self.__failed_tag_names = set()
+
+        # cache of entity_type -> vendor Step entity, queried once per session.
+        self.__vendor_steps = None
+
+        # cache of (entity_type, entity_id, step_id) -> Task entity, shared by all the items of an entity.
+        self.__context_tasks = dict()
+
+        # contexts waiting for their Task while a manifest chunk is collected, keyed by id(context).
+        # None when Tasks are resolved right away.
+        self.__pending_context_tasks = None
+
+        # cache of raw work_path_template name -> resolved templates across environments, used by note items.
+        self.__note_templates = dict()
+
     class FieldsCreatePropertyWidget(HookBaseClass.FieldsPropertyWidget):
         def __init__(self, parent, hook, items, name, **kwargs):
 
@@ -328,6 +403,10 @@ class IngestCollectorPlugin(HookBaseClass):
         item = super(IngestCollectorPlugin, self)._add_file_item(settings, parent_item, path, is_sequence, seq_files,
                                                                  item_name, item_type, context, properties)
 
+        # the Task of this item's context is resolved along with the rest of the manifest chunk
+        if self.__pending_context_tasks and id(item.context) in self.__pending_context_tasks:
+            self.__pending_context_tasks[id(item.context)]["items"].append(item)
+
         # create/add the properties required for missing fields and context fields
         if "missing_fields" not in item.properties:
             item.properties.missing_fields = dict()
@@ -394,24 +473,8 @@ class IngestCollectorPlugin(HookBaseClass):
 
                 relevant_item_settings = raw_item_settings[item_type]
                 raw_template_name = relevant_item_settings.get("work_path_template")
-                envs = self.parent.sgtk.pipeline_configuration.get_environments()
-
-                template_names_per_env = [
-                    sgtk.platform.resolve_setting_expression(raw_template_name,
-                                                             self.parent.engine.instance_name,
-                                                             env_name) for env_name in envs
-                ]
-
-                templates_per_env = [self.parent.get_template_by_name(template_name) for template_name in
-                                     template_names_per_env if self.parent.get_template_by_name(template_name)]
-                for template in templates_per_env:
-                    try:
-                        template.get_fields(path)
-                        # we have a match!
-                        work_path_template = template.name
-                    except:
-                        # it errored out
-                        continue
+
+                work_path_template = self._match_note_template(raw_template_name, path)
 
                 if work_path_template:
                     # calculate the context and give to the item
@@ -434,6 +497,61 @@ class IngestCollectorPlugin(HookBaseClass):
                                         })
                     continue
 
+    def _get_note_templates(self, raw_template_name):
+        """
+        Resolves a raw work_path_template name across all the environments, once per collector instance.
+
+        :param raw_template_name: Raw template name/expression from the item settings
+        :return: List of (static prefix, static suffix, template) tuples, in environment order.
+        """
+        if raw_template_name in self.__note_templates:
+            return self.__note_templates[raw_template_name]
+
+        envs = self.parent.sgtk.pipeline_configuration.get_environments()
+
+        note_templates = list()
+        template_names = set()
+        for env_name in envs:
+            template_name = sgtk.platform.resolve_setting_expression(raw_template_name,
+                                                                     self.parent.engine.instance_name,
+                                                                     env_name)
+            # same template might be resolved from multiple environments
+            if template_name in template_names:
+                continue
+            template_names.add(template_name)
+
+            template = self.parent.get_template_by_name(template_name)
+            if not template:
+                continue
+
+            # static parts of the definition, before the first and after the last key/optional section.
+            prefix = re.split(r"[\[{]", template.definition, 1)[0]
+            suffix = re.split(r"[\]}]", template.definition)[-1] if "{" in template.definition else ""
+            if isinstance(template, tank.template.TemplatePath):
+                prefix = os.path.join(template.root_path, prefix)
+
+            note_templates.append((prefix, suffix, template))
+
+        self.__note_templates[raw_template_name] = note_templates
+        return note_templates
+
+    def _match_note_template(self, raw_template_name, path):
+        """
+        Finds the template matching the path, among the templates resolved from a raw work_path_template name.
+        Only the templates whose static prefix and suffix match the path are validated.
+
+        :param raw_template_name: Raw template name/expression from the item settings
+        :param path: Path to match
+        :return: Name of the matching template, or None if no template matches.
+        """
+        # the last matching environment wins
+        for prefix, suffix, template in reversed(self._get_note_templates(raw_template_name)):
+            if path.startswith(prefix) and path.endswith(suffix) and template.validate(path):
+                # we have a match!
+                return template.name
+
+        return None
+
     def process_file(self, settings, parent_item, path):
         """
         Analyzes the given file and creates one or more items
@@ -560,14 +678,195 @@ class IngestCollectorPlugin(HookBaseClass):
 
         return fields
 
-    def _process_manifest_file(self, settings, path):
+    def _iter_manifest_records(self, path):
+        """
+        Streams the records of a manifest file, one at a time.
+        The top level sections (snapshots, notes, versions) are walked using the yaml events,
+        and only a single record is constructed in memory at any given time.
+
+        :param path: path to yaml file
+        :return: Generator of (section, record) tuples, eg. ("snapshots", {...})
+        """
+        with open(path, 'r') as f:
+            loader = ManifestLoader(f)
+            try:
+                # skip the stream and document start events
+                loader.get_event()
+                if loader.check_event(yaml.events.StreamEndEvent):
+                    return
+                loader.get_event()
+
+                if not loader.check_event(yaml.events.MappingStartEvent):
+                    raise yaml.YAMLError("Manifest file doesn't contain a mapping of sections.")
+                loader.get_event()
+
+                while not loader.check_event(yaml.events.MappingEndEvent):
+                    section = loader.construct_document(loader.compose_node(None, None))
+
+                    if section in MANIFEST_RECORD_SCHEMA and loader.check_event(yaml.events.SequenceStartEvent):
+                        loader.get_event()
+                        while not loader.check_event(yaml.events.SequenceEndEvent):
+                            yield section, loader.construct_document(loader.compose_node(None, None))
+                        loader.get_event()
+                    else:
+                        # sections we don't process are skipped without being constructed.
+                        loader.compose_node(None, None)
+            finally:
+                loader.dispose()
+
+    def _validate_manifest_record(self, section, record):
+        """
+        Validates a manifest record against MANIFEST_RECORD_SCHEMA.
+
+        :param section: Manifest section the record belongs to (snapshots, notes, versions)
+        :param record: Record read from the manifest
+        :return: List of errors, empty if the record is valid.
+        """
+        if not isinstance(record, dict):
+            return ["Expected a mapping, got %s" % type(record).__name__]
+
+        errors = list()
+        record_schema = MANIFEST_RECORD_SCHEMA[section]
+
+        for key, value_type in record_schema["required"].iteritems():
+            if key not in record:
+                errors.append("Missing required key '%s'" % key)
+            elif not isinstance(record[key], value_type):
+                errors.append("Key '%s' should be of type %s" % (key, value_type))
+
+        for key, value_type in record_schema["optional"].iteritems():
+            if key in record and record[key] is not None and not isinstance(record[key], value_type):
+                errors.append("Key '%s' should be of type %s" % (key, value_type))
+
+        return errors
+
+    def _process_manifest_snapshot(self, file_item_manifest_mappings, base_dir, snapshot):
+        """
+        Process a snapshot record of the manifest file into a file entity.
+
+        :param file_item_manifest_mappings: Manifest SG Mappings for the snapshots of file items
+        :param base_dir: Directory of the manifest file
+        :param snapshot: Snapshot record
+        :return: Processed file entity, see _process_manifest_file
+        """
+        # first replace all the snapshot with the Manifest SG Mappings
+        data = dict()
+        data["fields"] = {file_item_manifest_mappings[k] if k in file_item_manifest_mappings else k: v
+                          for k, v in snapshot.iteritems()}
+
+        # let's process file_types now!
+        data["files"] = dict()
+        file_types = data["fields"].pop("file_types")
+        for file_type, files in file_types.iteritems():
+            if "frame_range" in files:
+                p_file = files["files"][0]["path"]
+                p_file = os.path.join(base_dir, p_file)
+                # let's pick the first file and let the collector run _collect_folder on this
+                # since this is already a file sequence
+                append_path = os.path.dirname(p_file)
+                # list of tag names
+                if append_path not in data["files"]:
+                    data["files"][append_path] = list()
+                data["files"][append_path].append(file_type)
+            # not a file sequence store the file names, to run _collect_file
+            else:
+                p_files = files["files"]
+                for p_file in p_files:
+                    append_path = os.path.join(base_dir, p_file["path"])
+
+                    # list of tag names
+                    if append_path not in data["files"]:
+                        data["files"][append_path] = list()
+                    data["files"][append_path].append(file_type)
+
+        return {"file": data}
+
+    def _process_manifest_note(self, note_item_manifest_mappings, base_dir, note, note_snapshot, note_version):
+        """
+        Process a note record of the manifest file, along with it's snapshot and version into a note entity.
+
+        :param note_item_manifest_mappings: Manifest SG Mappings for the notes, snapshots and versions of note items
+        :param base_dir: Directory of the manifest file
+        :param note: Note record
+        :param note_snapshot: Snapshot record associated with the note
+        :param note_version: Version record associated with the note
+        :return: Processed note entity, see _process_manifest_file
+        """
+        # first replace all the snapshot with the Manifest SG Mappings
+
+        data = dict()
+        snapshot_data = dict()
+        version_data = dict()
+
+        note_manifest_mappings = note_item_manifest_mappings["notes"]
+        data["fields"] = {note_manifest_mappings[k] if k in note_manifest_mappings else k: v
+                          for k, v in note.iteritems()}
+
+        # special case handling for note links, this is a list of entities
+        # it will converted to a dict in ingest_note_links <link["type"]>: link
+        # this is to facilitate easier access using nested keys of a dict
+        if "note_links" in note:
+            data["fields"]["ingest_note_links"] = dict()
+            for note_link in note["note_links"]:
+                data["fields"]["ingest_note_links"][note_link["type"]] = note_link
+
+        # pop the notes from version_data they are already stored
+        if "notes" in note_version:
+            note_version.pop("notes")
+
+        version_manifest_mappings = note_item_manifest_mappings["versions"]
+        version_data["fields"] = {version_manifest_mappings[k] if k in version_manifest_mappings else k: v
+                                  for k, v in note_version.iteritems()}
+
+        # update the item fields with version_data fields
+        data["fields"].update(version_data["fields"])
+
+        # snapshot fields get priority over version fields
+        snapshot_manifest_mappings = note_item_manifest_mappings["snapshots"]
+        snapshot_data["fields"] = {snapshot_manifest_mappings[k] if k in snapshot_manifest_mappings else k: v
+                                   for k, v in note_snapshot.iteritems()}
+
+        # pop the files from snapshot_data they are not useful
+        if "file_types" in note_snapshot:
+            snapshot_data["fields"].pop("file_types")
+
+        # update the item fields with snapshot_data fields
+        data["fields"].update(snapshot_data["fields"])
+
+        # let's process the attachments now!
+        data["files"] = dict()
+        attachments = data["fields"].pop("attachments")
+
+        if attachments:
+            # add one path of attachment for template parsing
+            append_path = os.path.join(base_dir, attachments[0]["path"])
+
+            if append_path not in data["files"]:
+                data["files"][append_path] = list()
+
+        # re-create the attachments field for later use by publish
+        data["fields"]["attachments"] = list()
+
+        for attachment in attachments:
+            data["fields"]["attachments"].append(os.path.join(base_dir, attachment["path"]))
+
+        return {"note": data}
+
+    def _process_manifest_file(self, settings, path, errors=None):
         """
         Do the required processing on the yaml file, sanitisation or validations.
         conversions mentioned in Manifest Types setting of the collector hook.
 
+        Snapshots are processed as soon as they are read from the manifest, notes are processed once the
+        whole file has been read, since they are paired with the snapshot and version at the same index.
+        Only the fields needed to pair the notes are kept in memory, the file_types of the snapshots and
+        the notes of the versions are dropped as soon as they are read.
+
         :param path: path to yaml file
-        :return: list of processed snapshots, in the format
-        [{file(type of collect method to run):
+        :param errors: Optional list, filled with the errors found while processing the manifest.
+        :raises TankError: If the manifest file can't be read, the entities already yielded must be discarded.
+        :return: Generator of processed snapshots, in the format
+        {file(type of collect method to run):
             {'fields': {'context_type': 'maya_model',
                         'department': 'model',
                         'description': 'n/a',
@@ -584,10 +883,9 @@ class IngestCollectorPlugin(HookBaseClass):
                        '/dd/home/gverma/work/SHARED/MODEL/enviro/egypt_riser_a/hi/maya_model/egypt_riser_a_hi_transform_v001.xml': ['transform_xml'],
                        '/dd/home/gverma/work/SHARED/MODEL/enviro/egypt_riser_a/hi/maya_model/egypt_riser_a_hi_v001.mb': ['main', 'mayaBinary']}
             }
-        }]
+        }
         """
 
-        processed_snapshots = list()
         manifest_mappings = settings["Manifest SG Mappings"].value
 
         # since we only process snapshots in this manifest.
@@ -599,83 +897,58 @@ class IngestCollectorPlugin(HookBaseClass):
         # yaml file stays at the base of the package
         base_dir = os.path.dirname(path)
 
-        snapshots = list()
-        notes = list()
-        versions = list()
-        notes_index = 0
+        records = {section: list() for section in MANIFEST_RECORD_SCHEMA}
 
-        with open(path, 'r') as f:
-            try:
-                contents = yaml.load(f)
-                snapshots = contents["snapshots"]
-                if "notes" in contents:
-                    notes = contents["notes"]
-                if "versions" in contents:
-                    versions = contents["versions"]
-            except Exception:
-                self.logger.error(
-                    "Failed to read the manifest file %s" % path,
-                    extra={
-                        "action_show_more_info": {
-                            "label": "Show Error Log",
-                            "tooltip": "Show the error log",
-                            "text": traceback.format_exc()
+        try:
+            for section, record in self._iter_manifest_records(path):
+                record_errors = self._validate_manifest_record(section, record)
+                if record_errors:
+                    if errors is not None:
+                        errors.extend(record_errors)
+                    self.logger.error(
+                        "Invalid %s record in the manifest file %s" % (section, path),
+                        extra={
+                            "action_show_more_info": {
+                                "label": "Show Errors",
+                                "tooltip": "Show the validation errors",
+                                "text": "Errors:\n%s\nRecord:\n%s" % ("\n".join(record_errors),
+                                                                                pprint.pformat(record))
+                            }
                         }
+                    )
+                    # keep the index of the records intact, notes are paired by index.
+                    record = dict()
+                elif section == "snapshots":
+                    yield self._process_manifest_snapshot(file_item_manifest_mappings, base_dir, record)
+
+                # only keep what the notes need, notes are paired by index.
+                if section == "snapshots":
+                    record = {k: v for k, v in record.iteritems() if k != "file_types"}
+                elif section == "versions":
+                    record = {k: v for k, v in record.iteritems() if k != "notes"}
+                records[section].append(record)
+        except Exception:
+            if errors is not None:
+                errors.append(traceback.format_exc())
+            self.logger.error(
+                "Failed to read the manifest file %s" % path,
+                extra={
+                    "action_show_more_info": {
+                        "label": "Show Error Log",
+                        "tooltip": "Show the error log",
+                        "text": traceback.format_exc()
                     }
-                )
-                return processed_snapshots
-
-        for snapshot in snapshots:
-            # first replace all the snapshot with the Manifest SG Mappings
-            data = dict()
-            data["fields"] = {file_item_manifest_mappings[k] if k in file_item_manifest_mappings else k: v
-                              for k, v in snapshot.iteritems()}
-
-            # let's process file_types now!
-            data["files"] = dict()
-            file_types = data["fields"].pop("file_types")
-            for file_type, files in file_types.iteritems():
-                if "frame_range" in files:
-                    p_file = files["files"][0]["path"]
-                    p_file = os.path.join(base_dir, p_file)
-                    # let's pick the first file and let the collector run _collect_folder on this
-                    # since this is already a file sequence
-                    append_path = os.path.dirname(p_file)
-                    # list of tag names
-                    if append_path not in data["files"]:
-                        data["files"][append_path] = list()
-                    data["files"][append_path].append(file_type)
-                # not a file sequence store the file names, to run _collect_file
-                else:
-                    p_files = files["files"]
-                    for p_file in p_files:
-                        append_path = os.path.join(base_dir, p_file["path"])
-
-                        # list of tag names
-                        if append_path not in data["files"]:
-                            data["files"][append_path] = list()
-                        data["files"][append_path].append(file_type)
-
-            processed_snapshots.append({"file": data})
-
-        for note in notes:
-            # first replace all the snapshot with the Manifest SG Mappings
-
-            data = dict()
-            snapshot_data = dict()
-            version_data = dict()
+                }
+            )
+            raise TankError("Failed to read the manifest file %s" % path)
 
-            note_manifest_mappings = note_item_manifest_mappings["notes"]
-            data["fields"] = {note_manifest_mappings[k] if k in note_manifest_mappings else k: v
-                              for k, v in note.iteritems()}
+        snapshots = records["snapshots"]
+        versions = records["versions"]
 
-            # special case handling for note links, this is a list of entities
-            # it will converted to a dict in ingest_note_links <link["type"]>: link
-            # this is to facilitate easier access using nested keys of a dict
-            if "note_links" in note:
-                data["fields"]["ingest_note_links"] = dict()
-                for note_link in note["note_links"]:
-                    data["fields"]["ingest_note_links"][note_link["type"]] = note_link
+        for notes_index, note in enumerate(records["notes"]):
+            # skip the notes that failed the validation
+            if not note:
+                continue
 
             # every note item might not have a corresponding snapshot and version associated with it
             # in that case don't pick out the fields from snapshot and version
@@ -687,99 +960,362 @@ class IngestCollectorPlugin(HookBaseClass):
                 note_snapshot = snapshots[notes_index]
                 note_version = versions[notes_index]
 
-            # pop the notes from version_data they are already stored
-            if "notes" in note_version:
-                note_version.pop("notes")
+            yield self._process_manifest_note(note_item_manifest_mappings, base_dir,
+                                              note, note_snapshot, note_version)
 
-            version_manifest_mappings = note_item_manifest_mappings["versions"]
-            version_data["fields"] = {version_manifest_mappings[k] if k in version_manifest_mappings else k: v
-                                      for k, v in note_version.iteritems()}
+    def _prefetch_associated_tags(self, tags):
+        """
+        Queries/Creates tag entities for a list of tag names, in bulk.
+        Tag names that are already cached are skipped, the remaining names are queried
+        using a single find and the missing ones are created using a single batch call.
+        Names are compared case insensitively.
 
-            # update the item fields with version_data fields
-            data["fields"].update(version_data["fields"])
+        :param tags: List of tag names.
+        """
 
-            # snapshot fields get priority over version fields
-            snapshot_manifest_mappings = note_item_manifest_mappings["snapshots"]
-            snapshot_data["fields"] = {snapshot_manifest_mappings[k] if k in snapshot_manifest_mappings else k: v
-                                       for k, v in note_snapshot.iteritems()}
+        # one spelling per lower case name
+        tag_names = dict()
+        for tag_name in tags:
+            tag_key = tag_name.lower()
+            if tag_key not in self.__tag_entities and tag_key not in self.__failed_tag_names:
+                tag_names.setdefault(tag_key, tag_name)
+        if not tag_names:
+            return
 
-            # pop the files from snapshot_data they are not useful
-            if "file_types" in note_snapshot:
-                snapshot_data["fields"].pop("file_types")
+        fields = ["name", "id", "code", "type"]
+        tag_entities = self.sgtk.shotgun.find(entity_type="Tag", filters=[["name", "in", tag_names.values()]],
+                                              fields=fields)
+        for tag_entity in tag_entities:
+            self.__tag_entities.setdefault(tag_entity["name"].lower(), tag_entity)
+
+        missing_tag_names = [tag_name for tag_key, tag_name in tag_names.iteritems()
+                             if tag_key not in self.__tag_entities]
+        if not missing_tag_names:
+            return
 
-            # update the item fields with snapshot_data fields
-            data["fields"].update(snapshot_data["fields"])
+        batch_data = [
+            {
+                "request_type": "create",
+                "entity_type": "Tag",
+                "data": dict(name=tag_name),
+                "return_fields": fields
+            } for tag_name in missing_tag_names
+        ]
+
+        try:
+            new_entities = self.sgtk.shotgun.batch(batch_data)
+            for new_entity in new_entities:
+                self.__tag_entities[new_entity["name"].lower()] = new_entity
+        except Exception:
+            # the files are collected without these tags, don't try again for every file.
+            self.__failed_tag_names.update(tag_name.lower() for tag_name in missing_tag_names)
+            self.logger.error(
+                "Failed to create Tags: %s" % ", ".join(missing_tag_names),
+                extra={
+                    "action_show_more_info": {
+                        "label": "Show Error log",
+                        "tooltip": "Show the error log",
+                        "text": traceback.format_exc()
+                    }
+                }
+            )
 
-            # let's process the attachments now!
-            data["files"] = dict()
-            attachments = data["fields"].pop("attachments")
+    def _query_associated_tags(self, tags):
+        """
+        Queries/Creates tag entities given a list of tag names.
 
-            if attachments:
-                # add one path of attachment for template parsing
-                append_path = os.path.join(base_dir, attachments[0]["path"])
+        :param tags: List of tag names.
+        :return: List of created/existing tag entities.
+        """
 
-                if append_path not in data["files"]:
-                    data["files"][append_path] = list()
+        # only hits shotgun for the tags that haven't been resolved in this session yet.
+        self._prefetch_associated_tags(tags)
 
-            # re-create the attachments field for later use by publish
-            data["fields"]["attachments"] = list()
+        return [self.__tag_entities[tag_name.lower()] for tag_name in tags if tag_name.lower() in self.__tag_entities]
 
-            for attachment in attachments:
-                data["fields"]["attachments"].append(os.path.join(base_dir, attachment["path"]))
+    def _collect_manifest_file(self, settings, parent_item, path):
+        """
+        Process the supplied manifest file.
+        Items are created incrementally, as the entities are read from the manifest.
 
-            processed_snapshots.append({"note": data})
+        :param dict settings: Configured settings for this collector
+        :param parent_item: parent item instance
+        :param path: Path to analyze
 
-            # move to the next snapshot
-            notes_index += 1
+        :returns: The item that was created
+        """
 
-        return processed_snapshots
+        file_items = list()
+        processed_entities = list()
 
-    def _query_associated_tags(self, tags):
+        # re-collecting an unchanged manifest doesn't need to parse the yaml again.
+        cache_path = self._get_manifest_cache_path(settings, path)
+        cached_entities = self._read_manifest_cache(cache_path) if cache_path else None
+
+        cache_file = None
+        if cached_entities is not None:
+            self.logger.debug("Using the cached manifest for %s" % path)
+            manifest_entities = cached_entities
+        else:
+            errors = list()
+            # the cache is written chunk by chunk, the entities of the whole manifest are never held in memory.
+            cache_file = self._open_manifest_cache(cache_path) if cache_path else None
+            # process the manifest file first, replace the fields to relevant names.
+            # collect the tags a file has too.
+            manifest_entities = self._process_manifest_file(settings, path, errors)
+
+        manifest_entities = iter(manifest_entities)
+        while True:
+            try:
+                entity = next(manifest_entities)
+            except StopIteration:
+                break
+            except TankError:
+                # the manifest couldn't be read till the end, nothing is collected from it.
+                for file_item in file_items:
+                    file_item.parent.remove_item(file_item)
+                if cache_file:
+                    self._discard_manifest_cache(cache_file)
+                if cached_entities is not None and self._remove_manifest_cache(cache_path):
+                    # the cache file is corrupted, collect from the manifest itself.
+                    return self._collect_manifest_file(settings, parent_item, path)
+                return list()
+
+            processed_entities.append(entity)
+            if len(processed_entities) >= MANIFEST_COLLECT_CHUNK_SIZE:
+                if cache_file:
+                    cache_file = self._write_manifest_cache(cache_file, processed_entities)
+                file_items.extend(self._collect_manifest_entities(settings, parent_item, processed_entities))
+                processed_entities = list()
+
+        if cache_file:
+            cache_file = self._write_manifest_cache(cache_file, processed_entities)
+        file_items.extend(self._collect_manifest_entities(settings, parent_item, processed_entities))
+
+        # only cache the manifests that were processed without any errors
+        if cache_file:
+            if errors:
+                self._discard_manifest_cache(cache_file)
+            else:
+                self._commit_manifest_cache(settings, cache_path, cache_file)
+
+        return file_items
+
+    def _get_manifest_cache_path(self, settings, path):
         """
-        Queries/Creates tag entities given a list of tag names.
+        Path of the processed manifest in the on-disk cache.
+        The cache key is made from the content of the manifest, it's location (files are relative to it)
+        and the Manifest SG Mappings used to process it.
 
-        :param tags: List of tag names.
-        :return: List of created/existing tag entities.
+        :param dict settings: Configured settings for this collector
+        :param path: path to yaml file
+        :return: Path to the cache file, or None if the cache is disabled.
         """
+        if not settings["Manifest Cache Size"].value:
+            return None
 
-        tag_entities = list()
+        content_hash = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                content_hash.update(chunk)
 
-        fields = ["name", "id", "code", "type"]
-        for tag_name in tags:
-            tag_entity = self.sgtk.shotgun.find_one(entity_type="Tag", filters=[["name", "is", tag_name]], fields=fields)
-            if tag_entity:
-                tag_entities.append(tag_entity)
-            else:
+        # pformat sorts the dict keys, so this is stable across sessions.
+        settings_hash = hashlib.sha1(pprint.pformat([MANIFEST_CACHE_VERSION,
+                                                     os.path.dirname(path),
+                                                     settings["Manifest SG Mappings"].value]))
+
+        return os.path.join(self.parent.cache_location, "ingest_manifests",
+                            "%s_%s.pickle" % (content_hash.hexdigest(), settings_hash.hexdigest()))
+
+    def _read_manifest_cache(self, cache_path):
+        """
+        Read the processed manifest entities from the on-disk cache.
+        The entities are read lazily, one chunk at a time.
+
+        :param cache_path: Path to the cache file
+        :return: Generator of processed entities, or None if the manifest isn't cached.
+            The generator raises a TankError if the cache file can't be read.
+        """
+        if not os.path.exists(cache_path):
+            return None
+
+        try:
+            cache_file = open(cache_path, 'rb')
+            # touch the cache file, this is used as the last access time during eviction.
+            os.utime(cache_path, None)
+        except Exception:
+            self.logger.debug("Failed to read the manifest cache %s\n%s" % (cache_path, traceback.format_exc()))
+            return None
+
+        return self._iter_manifest_cache(cache_path, cache_file)
+
+    def _iter_manifest_cache(self, cache_path, cache_file):
+        """
+        Yields the processed entities of every chunk pickled in the cache file.
+
+        :param cache_path: Path to the cache file
+        :param cache_file: Cache file opened for reading
+        :raises TankError: If a chunk can't be read.
+        """
+        with cache_file:
+            while True:
                 try:
-                    new_entity = self.sgtk.shotgun.create(entity_type="Tag", data=dict(name=tag_name))
-                    tag_entities.append(new_entity)
+                    processed_entities = cPickle.load(cache_file)
+                except EOFError:
+                    return
                 except Exception:
-                    self.logger.error(
-                        "Failed to create Tag: %s" % tag_name,
-                        extra={
-                            "action_show_more_info": {
-                                "label": "Show Error log",
-                                "tooltip": "Show the error log",
-                                "text": traceback.format_exc()
-                            }
-                        }
-                    )
-        return tag_entities
+                    self.logger.debug("Failed to read the manifest cache %s\n%s" % (cache_path,
+                                                                                   traceback.format_exc()))
+                    raise TankError("Failed to read the manifest cache %s" % cache_path)
 
-    def _collect_manifest_file(self, settings, parent_item, path):
+                for entity in processed_entities:
+                    yield entity
+
+    def _remove_manifest_cache(self, cache_path):
         """
-        Process the supplied manifest file.
+        Remove a manifest from the on-disk cache.
+
+        :param cache_path: Path to the cache file
+        :return: True if the cache file was removed.
+        """
+        try:
+            os.remove(cache_path)
+            return True
+        except OSError:
+            self.logger.debug("Failed to remove the manifest cache %s\n%s" % (cache_path, traceback.format_exc()))
+            return False
+
+    def _open_manifest_cache(self, cache_path):
+        """
+        Open a temporary file next to the cache file, the processed entities are written to it chunk by chunk.
+
+        :param cache_path: Path to the cache file
+        :return: Temporary file opened for writing, or None if it couldn't be created.
+        """
+        tmp_path = "%s.%s.tmp" % (cache_path, os.getpid())
+
+        try:
+            ensure_folder_exists(os.path.dirname(cache_path))
+            return open(tmp_path, 'wb')
+        except Exception:
+            self.logger.debug("Failed to write the manifest cache %s\n%s" % (cache_path, traceback.format_exc()))
+            return None
+
+    def _write_manifest_cache(self, cache_file, processed_entities):
+        """
+        Append a chunk of processed manifest entities to the temporary cache file.
+
+        :param cache_file: Temporary file returned by _open_manifest_cache
+        :param processed_entities: List of processed entities, see _process_manifest_file
+        :return: The temporary file, or None if the chunk couldn't be written and the file was discarded.
+        """
+        try:
+            cPickle.dump(processed_entities, cache_file, cPickle.HIGHEST_PROTOCOL)
+            return cache_file
+        except Exception:
+            self.logger.debug("Failed to write the manifest cache %s\n%s" % (cache_file.name,
+                                                                            traceback.format_exc()))
+            self._discard_manifest_cache(cache_file)
+            return None
+
+    def _discard_manifest_cache(self, cache_file):
+        """
+        Close and remove a temporary cache file.
+
+        :param cache_file: Temporary file returned by _open_manifest_cache
+        """
+        try:
+            cache_file.close()
+            os.remove(cache_file.name)
+        except Exception:
+            self.logger.debug("Failed to remove the manifest cache %s\n%s" % (cache_file.name,
+                                                                             traceback.format_exc()))
+
+    def _commit_manifest_cache(self, settings, cache_path, cache_file):
+        """
+        Move a fully written temporary cache file to the cache path, and evict the least recently used
+        manifests if the cache is over the configured size.
+
+        :param dict settings: Configured settings for this collector
+        :param cache_path: Path to the cache file
+        :param cache_file: Temporary file returned by _open_manifest_cache
+        """
+        cache_dir = os.path.dirname(cache_path)
+
+        try:
+            cache_file.close()
+            # rename is atomic, concurrent sessions never read a partially written cache file.
+            os.rename(cache_file.name, cache_path)
+        except Exception:
+            self.logger.debug("Failed to write the manifest cache %s\n%s" % (cache_path, traceback.format_exc()))
+            if os.path.exists(cache_file.name):
+                os.remove(cache_file.name)
+            return
+
+        max_size = settings["Manifest Cache Size"].value * 1024 * 1024
+
+        cache_files = list()
+        for file_name in os.listdir(cache_dir):
+            if not file_name.endswith(".pickle"):
+                continue
+            file_path = os.path.join(cache_dir, file_name)
+            try:
+                file_stat = os.stat(file_path)
+            except OSError:
+                continue
+            cache_files.append((file_stat.st_mtime, file_stat.st_size, file_path))
+
+        cache_size = sum(file_size for _, file_size, _ in cache_files)
+
+        # least recently used first
+        for _, file_size, file_path in sorted(cache_files):
+            if cache_size <= max_size:
+                break
+            try:
+                os.remove(file_path)
+                cache_size -= file_size
+            except OSError:
+                continue
+
+    def _collect_manifest_entities(self, settings, parent_item, processed_entities):
+        """
+        Creates the items for a chunk of processed manifest entities.
 
         :param dict settings: Configured settings for this collector
         :param parent_item: parent item instance
-        :param path: Path to analyze
+        :param processed_entities: List of entities processed from the manifest, see _process_manifest_file
 
-        :returns: The item that was created
+        :returns: The items that were created
+        """
+
+        # query/create all the tags used in this chunk at once.
+        manifest_tags = list()
+        for entity in processed_entities:
+            if "file" in entity:
+                for tags in entity["file"]["files"].itervalues():
+                    manifest_tags.extend(tags)
+        self._prefetch_associated_tags(manifest_tags)
+
+        # the Tasks of all the items of this chunk are resolved at once, once the items are created.
+        self.__pending_context_tasks = dict()
+        try:
+            file_items = self._create_manifest_entity_items(settings, parent_item, processed_entities)
+            self._resolve_pending_context_tasks(settings)
+        finally:
+            self.__pending_context_tasks = None
+
+        return file_items
+
+    def _create_manifest_entity_items(self, settings, parent_item, processed_entities):
         """
+        Creates the items for a chunk of processed manifest entities.
 
-        # process the manifest file first, replace the fields to relevant names.
-        # collect the tags a file has too.
-        processed_entities = self._process_manifest_file(settings, path)
+        :param dict settings: Configured settings for this collector
+        :param parent_item: parent item instance
+        :param processed_entities: List of entities processed from the manifest, see _process_manifest_file
+
+        :returns: The items that were created
+        """
 
         file_items = list()
 
@@ -887,6 +1423,176 @@ class IngestCollectorPlugin(HookBaseClass):
 
         return file_items
 
+    def _get_vendor_step(self, entity_type):
+        """
+        Returns the vendor Step for the given entity type.
+        All the vendor Steps are queried at once, on first use.
+
+        :param entity_type: Entity type the Step belongs to (Sequence/Shot/Asset)
+        :return: Step entity or None if not found.
+        """
+        if self.__vendor_steps is None:
+            fields = ['entity_type', 'code', 'id', 'name']
+
+            # add a vendor step to all ingested files
+            step_entities = self.sgtk.shotgun.find(
+                entity_type='Step',
+                filters=[['short_name', 'is', "vendor"]],
+                fields=fields
+            )
+            # make sure we get the correct Step!
+            # this should handle whether the Step is from Sequence/Shot/Asset
+            self.__vendor_steps = {step_entity["entity_type"]: step_entity for step_entity in step_entities}
+
+        return self.__vendor_steps.get(entity_type)
+
+    def _get_context_task_key(self, context, step_entity):
+        """
+        Key used to cache the Task entity of a context.
+
+        :param context: The :class:`sgtk.Context` the Task belongs to
+        :param step_entity: Step entity of the Task
+        :return: tuple of (entity_type, entity_id, step_id)
+        """
+        return context.entity["type"], context.entity["id"], step_entity["id"]
+
+    def _resolve_context_tasks(self, context_steps):
+        """
+        Queries/Creates the Task entities for a list of (context, step) pairs, in bulk.
+        Pairs that are already cached are skipped, the remaining ones are grouped by (entity, step)
+        and queried using a single find. Missing Tasks are created using a single batch call, and only the
+        existing Tasks that are not already "na" get their status updated.
+
+        :param context_steps: List of (:class:`sgtk.Context`, Step entity) tuples.
+        """
+
+        # group the pairs by (entity, step)
+        unresolved = dict()
+        for context, step_entity in context_steps:
+            key = self._get_context_task_key(context, step_entity)
+            if key not in self.__context_tasks:
+                unresolved[key] = (context, step_entity)
+
+        if not unresolved:
+            return
+
+        task_fields = ['content', 'entity_type', 'id', 'step', 'entity', 'sg_status_list']
+
+        task_filters = [
+            ['step', 'in', list({step_entity["id"]: step_entity
+                                 for _, step_entity in unresolved.itervalues()}.values())],
+            ['entity', 'in', list({(context.entity["type"], context.entity["id"]): context.entity
+                                   for context, _ in unresolved.itervalues()}.values())],
+            ['project', 'in', list({context.project["id"]: context.project
+                                    for context, _ in unresolved.itervalues()}.values())],
+        ]
+
+        # FIXME: step entity in context has "name" and entity queried from shotgun has "code"
+        # names are compared case insensitively, like the "is" filter of SG does.
+        contents = dict()
+        for key, (context, step_entity) in unresolved.iteritems():
+            contents[key] = step_entity["name"] if step_entity.get("name") else step_entity["code"]
+
+        task_entities = self.sgtk.shotgun.find(
+            entity_type='Task',
+            filters=task_filters,
+            fields=task_fields
+        )
+
+        status_updates = list()
+        for task_entity in task_entities:
+            if not task_entity["entity"] or not task_entity["step"]:
+                continue
+            key = (task_entity["entity"]["type"], task_entity["entity"]["id"], task_entity["step"]["id"])
+            if key in unresolved and key not in self.__context_tasks and \
+                    (task_entity["content"] or "").lower() == contents[key].lower():
+                self.__context_tasks[key] = task_entity
+                # try to set the status of the task entity to na
+                if task_entity["sg_status_list"] != "na":
+                    status_updates.append({
+                        "request_type": "update",
+                        "entity_type": "Task",
+                        "entity_id": task_entity["id"],
+                        "data": {"sg_status_list": "na"}
+                    })
+
+        if status_updates:
+            try:
+                self.sgtk.shotgun.batch(status_updates)
+            except:
+                pass
+
+        # create the missing tasks
+        missing_keys = [key for key in unresolved if key not in self.__context_tasks]
+        if not missing_keys:
+            return
+
+        batch_data = list()
+        for key in missing_keys:
+            context, step_entity = unresolved[key]
+            batch_data.append({
+                "request_type": "create",
+                "entity_type": "Task",
+                "data": {
+                    "step": step_entity,
+                    "project": context.project,
+                    "entity": context.entity,
+                    "content": contents[key],
+                    "sg_status_list": "na"
+                },
+                "return_fields": task_fields
+            })
+
+        try:
+            new_entities = self.sgtk.shotgun.batch(batch_data)
+            for key, task_entity in zip(missing_keys, new_entities):
+                self.__context_tasks[key] = task_entity
+        except Exception:
+            self.logger.error("Failed to create Ingestion Tasks.",
+                              extra={
+                                  "action_show_more_info": {
+                                      "label": "Show Data",
+                                      "tooltip": "Show the error log",
+                                      "text": "Data: %s\nError: %s" % (pprint.pformat(batch_data),
+                                                                        traceback.format_exc())
+                                  }
+                              })
+
+    def _resolve_pending_context_tasks(self, settings):
+        """
+        Resolves the Tasks of all the pending contexts with a single call, and updates the context of their items.
+        The fields of the items are resolved again, with the Task in their context.
+
+        :param dict settings: Configured settings for this collector
+        """
+        pending_contexts = self.__pending_context_tasks.values()
+        if not pending_contexts:
+            return
+
+        self._resolve_context_tasks([(pending["context"], pending["step"]) for pending in pending_contexts])
+
+        for pending in pending_contexts:
+            task_entity = self.__context_tasks.get(self._get_context_task_key(pending["context"], pending["step"]))
+            if not task_entity:
+                self.logger.error("Failed to find an Ingestion Task.",
+                                  extra={
+                                      "action_show_more_info": {
+                                          "label": "Show Data",
+                                          "tooltip": "Show the error log",
+                                          "text": "Step: %s\nPath: %s" % (pprint.pformat(pending["step"]),
+                                                                           pending["path"])
+                                      }
+                                  })
+                continue
+
+            context = super(IngestCollectorPlugin, self)._get_item_context_from_path(pending["work_path_template"],
+                                                                                     pending["path"],
+                                                                                     pending["parent_item"],
+                                                                                     [pending["step"], task_entity])
+            for item in pending["items"]:
+                item.context = context
+                item.properties["fields"] = self._resolve_item_fields(settings, item)
+
     def _get_item_context_from_path(self, work_path_template, path, parent_item, default_entities=list()):
         """Updates the context of the item from the work_path_template/template, if needed.
 
@@ -910,75 +1616,41 @@ class IngestCollectorPlugin(HookBaseClass):
             # if the context already has a valid step use that.
             # we extract the step from the work_path_template, in case of notes.
             if not context.step:
-                step_filters = list()
-                step_filters.append(['short_name', 'is', "vendor"])
-
-                # make sure we get the correct Step!
-                # this should handle whether the Step is from Sequence/Shot/Asset
-                step_filters.append(["entity_type", "is", context.entity["type"]])
-
-                fields = ['entity_type', 'code', 'id', 'name']
-
-                # add a vendor step to all ingested files
-                step_entity = self.sgtk.shotgun.find_one(
-                    entity_type='Step',
-                    filters=step_filters,
-                    fields=fields
-                )
+                step_entity = self._get_vendor_step(context.entity["type"])
             else:
                 step_entity = context.step
 
             if step_entity:
                 default_entities = [step_entity]
-                # FIXME: step entity in context has "name" and entity queried from shotgun has "code"
-                content = step_entity["name"] if step_entity.get("name") else step_entity["code"]
-
-                task_filters = [
-                    ['step', 'is', step_entity],
-                    ['entity', 'is', context.entity],
-                    ['project', 'is', context.project],
-                    ['content', 'is', content]
-                ]
-
-                task_fields = ['content', 'entity_type', 'id']
-
-                task_entity = self.sgtk.shotgun.find_one(
-                    entity_type='Task',
-                    filters=task_filters,
-                    fields=task_fields
-                )
-
-                # create the task:
-                if not task_entity:
-
-                    data = {
-                        "step": step_entity,
-                        "project": context.project,
-                        "entity": context.entity,
-                        "content": content,
-                        "sg_status_list": "na"
-                    }
-
-                    task_entity = self.sgtk.shotgun.create("Task", data, return_fields=task_fields)
-                    if not task_entity:
-                        self.logger.error("Failed to create Ingestion Task.",
-                                          extra={
-                                              "action_show_more_info": {
-                                                  "label": "Show Data",
-                                                  "tooltip": "Show the error log",
-                                                  "text": "Data: %s\nPath: %s" % (pprint.pformat(data),
-                                                                                  path)
-                                              }
-                                          })
+                task_key = self._get_context_task_key(context, step_entity)
+
+                if self.__pending_context_tasks is not None and task_key not in self.__context_tasks:
+                    # collecting a manifest chunk, the Task is resolved along with the rest of the chunk.
+                    context = super(IngestCollectorPlugin, self)._get_item_context_from_path(work_path_template,
+                                                                                             path,
+                                                                                             parent_item,
+                                                                                             default_entities)
+                    self.__pending_context_tasks[id(context)] = dict(context=context, step=step_entity, path=path,
+                                                                     work_path_template=work_path_template,
+                                                                     parent_item=parent_item, items=list())
+                    return context
+
+                # tasks are shared by all the items of an entity, this only hits shotgun once per (entity, step).
+                self._resolve_context_tasks([(context, step_entity)])
+                task_entity = self.__context_tasks.get(task_key)
 
                 if task_entity:
-                    # try to set the status of the task entity to na
-                    try:
-                        self.sgtk.shotgun.update("Task", task_entity["id"], {"sg_status_list": "na"})
-                    except:
-                        pass
-
                     default_entities.append(task_entity)
+                else:
+                    self.logger.error("Failed to find an Ingestion Task.",
+                                      extra={
+                                          "action_show_more_info": {
+                                              "label": "Show Data",
+                                              "tooltip": "Show the error log",
+                                              "text": "Step: %s\nPath: %s" % (pprint.pformat(step_entity),
+                                                                               path)
+                                          }
+                                      })
 
                 context = super(IngestCollectorPlugin, self)._get_item_context_from_path(work_path_template,
                                                                               path,
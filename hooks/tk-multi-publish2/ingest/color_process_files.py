@@ -9,10 +9,12 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import re
 import copy
-import glob
+import fnmatch
 import pprint
 import traceback
+from multiprocessing.pool import ThreadPool
 
 import sgtk
 from sgtk import TankError
@@ -71,6 +73,14 @@ class ColorProcessFilesPlugin(HookBaseClass):
                     "This identifier will be added to publish name and publish type for creating PublishedFile entity."
                 )
             },
+            "finalize_file_workers": {
+                "type": "int",
+                "default_value": 8,
+                "description": (
+                    "Number of threads used to freeze the permissions and seal the published files. "
+                    "Frames of a sequence are finalized in parallel."
+                )
+            },
         }
 
         # add tags also to publish files
@@ -113,9 +123,34 @@ class ColorProcessFilesPlugin(HookBaseClass):
         return accept_data
 
     def register_publish(self, task_settings, item, path_to_publish):
+        """
+        Registers a single publish for the given path, after finalizing the published files.
+
+        :param task_settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the task_settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        :param path_to_publish: One of the processed paths of the item
+        """
+        publish_data = self._get_publish_data(task_settings, item, path_to_publish)
+
+        self._finalize_publish_path(task_settings, item, publish_data["path"])
+
+        self._register_publish(task_settings, item, publish_data)
+
+    def _get_publish_data(self, task_settings, item, path_to_publish):
+        """
+        Builds the arguments for registering the publish of the given path.
+
+        :param task_settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the task_settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        :param path_to_publish: One of the processed paths of the item
+        :return: Dictionary of keyword arguments for sgtk.util.register_publish
+        """
 
         publisher = self.parent
-        sg_publish_data = None
 
         publish_identifiers = item.properties.resolved_identifiers
 
@@ -180,42 +215,47 @@ class ColorProcessFilesPlugin(HookBaseClass):
             }
         )
 
+        return publish_data
+
+    def _finalize_publish_path(self, task_settings, item, publish_path):
+        """
+        Freezes the permissions and seals all the files of a publish path.
+
+        :param task_settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the task_settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        :param publish_path: Path of the publish, with a frame key for sequences.
+        """
+        publisher = self.parent
+
         # try to freeze file permissions
         if item.properties.is_sequence:
             seq_pattern = publisher.util.get_path_for_frame(publish_path, "*")
-            published_files = [f for f in glob.iglob(seq_pattern) if os.path.isfile(f)]
+            published_files = self._list_sequence_files(seq_pattern)
         else:
             published_files = [publish_path]
 
-        for published_file in published_files:
-            try:
-                sgtk.util.filesystem.freeze_permissions(published_file)
-            except OSError:
-                self.logger.warning(
-                    "Unable to make file '{}' read-only.".format(published_file),
-                    extra={
-                        "action_show_more_info": {
-                            "label": "Show Error Log",
-                            "tooltip": "Show the error log",
-                            "text": traceback.format_exc()
-                        }
-                    }
-                )
+        self._finalize_published_files(task_settings, published_files)
 
-            try:
-                sgtk.util.filesystem.seal_file(published_file)
-            except Exception as e:
-                # primary function is to copy. Do not raise exception if sealing fails.
-                self.logger.warning("File '%s' could not be sealed, skipping: %s" % (published_file, e))
-                self.logger.warning(traceback.format_exc())
+    def _register_publish(self, task_settings, item, publish_data):
+        """
+        Registers a single publish and stashes it in the item properties.
 
+        :param task_settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the task_settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        :param publish_data: Dictionary of keyword arguments for sgtk.util.register_publish
+        """
+        sg_publish_data = None
         exception = None
         # create the publish and stash it in the item properties for other
         # plugins to use.
         try:
             sg_publish_data = sgtk.util.register_publish(**publish_data)
 
-            self.logger.info("Publish registered for %s" % publish_path)
+            self.logger.info("Publish registered for %s" % publish_data["path"])
         except Exception as e:
             exception = e
             self.logger.error(
@@ -241,6 +281,168 @@ class ColorProcessFilesPlugin(HookBaseClass):
         if exception:
             raise exception
 
+    def _register_publishes_batch(self, task_settings, item, publish_data_list):
+        """
+        Registers all the publishes of an item in a single batch transaction.
+        Either all the PublishedFile entities get created or none of them do.
+
+        :param task_settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the task_settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        :param publish_data_list: List of dictionaries of keyword arguments for sgtk.util.register_publish
+        """
+        sg = self.sgtk.shotgun
+
+        try:
+            batch_data = list()
+            for publish_data in publish_data_list:
+                # dry run only builds the data of the PublishedFile entity, without creating it.
+                sg_data = sgtk.util.register_publish(dry_run=True, **publish_data)
+                batch_data.append({
+                    "request_type": "create",
+                    "entity_type": sg_data.pop("type"),
+                    "data": sg_data
+                })
+
+            self.logger.info("Registering %d publishes for %s..." % (len(batch_data), item.name))
+            sg_publish_data_list = sg.batch(batch_data)
+        except Exception:
+            self.logger.error(
+                "Couldn't register Publishes for %s" % item.name,
+                extra={
+                    "action_show_more_info": {
+                        "label": "Show Error Log",
+                        "tooltip": "Show the error log",
+                        "text": traceback.format_exc()
+                    }
+                }
+            )
+            self.undo(task_settings, item)
+            raise
+
+        if "sg_publish_data_list" not in item.properties:
+            item.properties.sg_publish_data_list = []
+
+        # add the publish data to item properties
+        item.properties.sg_publish_data_list.extend(sg_publish_data_list)
+
+        for publish_data in publish_data_list:
+            self.logger.info("Publish registered for %s" % publish_data["path"])
+
+        # register_publish uploads the thumbnails and creates the dependencies after the publish is created.
+        dependency_data = list()
+        for publish_data, sg_publish_data in zip(publish_data_list, sg_publish_data_list):
+            for dependency_id in publish_data["dependency_ids"]:
+                dependency_data.append({
+                    "request_type": "create",
+                    "entity_type": "PublishedFileDependency",
+                    "data": {
+                        "published_file": sg_publish_data,
+                        "dependent_published_file": {"type": "PublishedFile", "id": dependency_id}
+                    }
+                })
+
+            if publish_data["thumbnail_path"]:
+                try:
+                    sg.upload_thumbnail(sg_publish_data["type"], sg_publish_data["id"], publish_data["thumbnail_path"])
+                except Exception:
+                    self.logger.warning("Unable to upload the thumbnail for %s\n%s" % (publish_data["path"],
+                                                                                      traceback.format_exc()))
+
+        if dependency_data:
+            try:
+                sg.batch(dependency_data)
+            except Exception:
+                self.logger.warning("Unable to create the dependencies for %s\n%s" % (item.name,
+                                                                                     traceback.format_exc()))
+
+    def _list_sequence_files(self, seq_pattern):
+        """
+        Lists the files of a sequence, using a single listing of the sequence directory.
+
+        :param seq_pattern: Path of the sequence with a glob pattern in place of the frame number.
+        :return: Sorted list of the files matching the pattern.
+        """
+        seq_dir, seq_name = os.path.split(seq_pattern)
+        seq_regex = re.compile(fnmatch.translate(seq_name))
+
+        try:
+            file_names = os.listdir(seq_dir)
+        except OSError:
+            return []
+
+        seq_files = list()
+        for file_name in file_names:
+            if seq_regex.match(file_name):
+                file_path = os.path.join(seq_dir, file_name)
+                if os.path.isfile(file_path):
+                    seq_files.append(file_path)
+
+        return sorted(seq_files)
+
+    def _finalize_published_file(self, published_file):
+        """
+        Freezes the permissions and seals a single published file.
+
+        :param published_file: Path to the published file.
+        :return: List of (published_file, message, error log) tuples, for every step that failed.
+        """
+        failures = list()
+
+        try:
+            sgtk.util.filesystem.freeze_permissions(published_file)
+        except OSError:
+            failures.append((published_file, "Unable to make file read-only.", traceback.format_exc()))
+
+        try:
+            sgtk.util.filesystem.seal_file(published_file)
+        except Exception as e:
+            # primary function is to copy. Do not raise exception if sealing fails.
+            failures.append((published_file, "File could not be sealed, skipping: %s" % e, traceback.format_exc()))
+
+        return failures
+
+    def _finalize_published_files(self, task_settings, published_files):
+        """
+        Freezes the permissions and seals the published files, using a bounded pool of threads.
+        Failures are reported once, for all the files.
+
+        :param task_settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the task_settings property. The values are `Setting`
+            instances.
+        :param published_files: List of paths to the published files.
+        """
+        if not published_files:
+            return
+
+        workers = max(1, min(task_settings.get("finalize_file_workers").value or 1, len(published_files)))
+
+        if workers == 1:
+            results = map(self._finalize_published_file, published_files)
+        else:
+            pool = ThreadPool(workers)
+            try:
+                results = pool.map(self._finalize_published_file, published_files)
+            finally:
+                pool.close()
+                pool.join()
+
+        failures = [failure for result in results for failure in result]
+
+        if failures:
+            self.logger.warning(
+                "Unable to finalize %s of %s published file(s)." % (len(set(f[0] for f in failures)),
+                                                                   len(published_files)),
+                extra={
+                    "action_show_more_info": {
+                        "label": "Show Error Log",
+                        "tooltip": "Show the error log",
+                        "text": "\n".join("%s: %s\n%s" % failure for failure in failures)
+                    }
+                }
+            )
+
     def validate(self, task_settings, item):
         """
         Validates the given item to check that it is ok to publish.
@@ -387,9 +589,19 @@ class ColorProcessFilesPlugin(HookBaseClass):
             self.undo(task_settings, item)
             raise TankError(error_message)
         else:
-            # register publishes
+            publish_data_list = list()
             for processed_path in item.properties.pre_processed_paths:
-                self.register_publish(task_settings, item, processed_path)
+                publish_data = self._get_publish_data(task_settings, item, processed_path)
+                self._finalize_publish_path(task_settings, item, publish_data["path"])
+                publish_data_list.append(publish_data)
+
+            # register publishes
+            if any(publish_data["dependency_paths"] for publish_data in publish_data_list):
+                # dependency paths are resolved to publishes by register_publish, register them one by one.
+                for publish_data in publish_data_list:
+                    self._register_publish(task_settings, item, publish_data)
+            else:
+                self._register_publishes_batch(task_settings, item, publish_data_list)
 
     def undo(self, task_settings, item):
         """
@@ -421,29 +633,31 @@ class ColorProcessFilesPlugin(HookBaseClass):
         sg_publish_data_list = item.properties.get("sg_publish_data_list")
 
         if sg_publish_data_list:
-            for publish_data in sg_publish_data_list:
-                try:
-                    self.sgtk.shotgun.delete(publish_data["type"], publish_data["id"])
-                    self.logger.info("Cleaning up published file...",
-                                     extra={
-                                         "action_show_more_info": {
-                                             "label": "Publish Data",
-                                             "tooltip": "Show the publish data.",
-                                             "text": "%s" % publish_data
-                                         }
+            batch_data = [{"request_type": "delete", "entity_type": publish_data["type"], "entity_id": publish_data["id"]}
+                          for publish_data in sg_publish_data_list]
+            try:
+                # delete all the published files at once
+                self.sgtk.shotgun.batch(batch_data)
+                self.logger.info("Cleaning up published files...",
+                                 extra={
+                                     "action_show_more_info": {
+                                         "label": "Publish Data",
+                                         "tooltip": "Show the publish data.",
+                                         "text": "%s" % pprint.pformat(sg_publish_data_list)
                                      }
-                                     )
-                except Exception:
-                    self.logger.error(
-                        "Failed to delete PublishedFile Entity for %s" % item.name,
-                        extra={
-                            "action_show_more_info": {
-                                "label": "Show Error Log",
-                                "tooltip": "Show the error log",
-                                "text": traceback.format_exc()
-                            }
+                                 }
+                                 )
+            except Exception:
+                self.logger.error(
+                    "Failed to delete PublishedFile Entities for %s" % item.name,
+                    extra={
+                        "action_show_more_info": {
+                            "label": "Show Error Log",
+                            "tooltip": "Show the error log",
+                            "text": traceback.format_exc()
                         }
-                    )
+                    }
+                )
             # pop the sg_publish_data_list too
             item.properties.pop("sg_publish_data_list")
 
@@ -9,7 +9,9 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 
+import copy
 import pprint
+import traceback
 
 import sgtk
 from sgtk import TankError, TankMissingTemplateError, TankMissingTemplateKeysError
@@ -54,6 +56,97 @@ class IngestBasePlugin(HookBaseClass):
                     }
                 )
 
+    def _get_root_item(self, item):
+        """
+        Returns the root item of the tree the given item belongs to.
+
+        :param item: Item to get the root for.
+        :return: Root item of the publish session.
+        """
+        root_item = item
+        while root_item.parent:
+            root_item = root_item.parent
+        return root_item
+
+    def _get_session_cache(self, item, cache_name):
+        """
+        Returns a cache dictionary shared by all the ingest plugins, for the current publish session.
+        The cache is stored on the root item, so it lives as long as the collected items do.
+
+        :param item: Any item of the publish session.
+        :param cache_name: Name of the cache.
+        :return: Cache dictionary.
+        """
+        root_item = self._get_root_item(item)
+        if "ingest_session_cache" not in root_item.properties:
+            root_item.properties.ingest_session_cache = dict()
+        return root_item.properties.ingest_session_cache.setdefault(cache_name, dict())
+
+    def _schema_field_read(self, item, entity_type, field_name):
+        """
+        Reads the schema of a field, once per publish session.
+
+        :param item: Any item of the publish session.
+        :param entity_type: Entity type of the field.
+        :param field_name: Name of the field.
+        :return: Schema of the field, as returned by schema_field_read.
+        """
+        schema_cache = self._get_session_cache(item, "schema")
+        cache_key = "%s.%s" % (entity_type, field_name)
+
+        if cache_key not in schema_cache:
+            schema_cache[cache_key] = self.sgtk.shotgun.schema_field_read(entity_type, field_name)
+
+        return schema_cache[cache_key]
+
+    def _schema_field_add_valid_values(self, item, entity_type, field_name, values):
+        """
+        Adds values to the valid_values of a list field, with a single schema update.
+        The cached schema is updated in place after a successful update.
+
+        :param item: Any item of the publish session.
+        :param entity_type: Entity type of the field.
+        :param field_name: Name of the field.
+        :param values: List of values that should be valid.
+        :return: True if the schema was updated, False if all the values were already valid,
+        None if the schema update failed.
+        """
+        field_schema = self._schema_field_read(item, entity_type, field_name)
+        valid_values = field_schema[field_name]["properties"]["valid_values"]["value"]
+
+        missing_values = list()
+        for value in values:
+            if value not in valid_values and value not in missing_values:
+                missing_values.append(value)
+
+        if not missing_values:
+            return False
+
+        updated_values = copy.copy(valid_values)
+        updated_values.extend(missing_values)
+        try:
+            # update the schema for field_name
+            result = self.sgtk.shotgun.schema_field_update(entity_type, field_name,
+                                                           {"valid_values": updated_values})
+        except Exception:
+            self.logger.error(
+                "Failed to update %s.%s schema with values: %s" % (entity_type, field_name,
+                                                                   ", ".join(missing_values)),
+                extra={
+                    "action_show_more_info": {
+                        "label": "Show Error Log",
+                        "tooltip": "Show the error log",
+                        "text": traceback.format_exc()
+                    }
+                }
+            )
+            return None
+
+        if result:
+            valid_values.extend(missing_values)
+            self.logger.info("Added %s to %s.%s schema." % (", ".join(missing_values), entity_type, field_name))
+        return result
+
     def _resolve_template_setting_value(self, setting, item):
         """Resolve the setting template value"""
         publisher = self.parent
@@ -25,6 +25,16 @@ class IngestFilesPlugin(HookBaseClass):
     Inherits from PublishFilesPlugin
     """
 
+    def __init__(self, parent, **kwargs):
+        """
+        Construction
+        """
+        # call base init
+        super(IngestFilesPlugin, self).__init__(parent, **kwargs)
+
+        # items accepted by this plugin, with the settings of their task.
+        self.__accepted_items = dict()
+
     @property
     def settings_schema(self):
         """
@@ -115,8 +125,24 @@ class IngestFilesPlugin(HookBaseClass):
         if item.type == "file.cdl":
             accept_data["accepted"] = False
 
+        if accept_data["accepted"]:
+            self.__accepted_items[item] = task_settings
+        else:
+            self.__accepted_items.pop(item, None)
+
         return accept_data
 
+    def _get_accepted_items(self, item):
+        """
+        The checked items accepted by this plugin, in the tree of the given item.
+
+        :param item: Any item of the publish session.
+        :return: List of (item, task_settings) tuples.
+        """
+        return [(accepted_item, self.__accepted_items[accepted_item])
+                for accepted_item in self._get_root_item(item).descendants
+                if accepted_item in self.__accepted_items and accepted_item.checked]
+
     def validate(self, task_settings, item):
         """
         Validates the given item to check that it is ok to publish.
@@ -317,6 +343,7 @@ class IngestFilesPlugin(HookBaseClass):
 
     def _create_asset_type(self, task_settings, item):
         """Updates the sg_asset_type schema on SG to add the snapshot_type, if it doesn't already exist.
+        The snapshot_types of all the checked Asset linked items accepted by this plugin are added at once.
 
         :param item: Item to get the snapshot_type from
         :param task_settings: Dictionary of Settings. The keys are strings, matching
@@ -326,34 +353,33 @@ class IngestFilesPlugin(HookBaseClass):
         """
 
         if item.properties["linked_entity_type"] == "Asset":
-            sg_asset_type_schema = self.sgtk.shotgun.schema_field_read("Asset", "sg_asset_type")
+            sg_asset_type_schema = self._schema_field_read(item, "Asset", "sg_asset_type")
             existing_asset_types = sg_asset_type_schema["sg_asset_type"]["properties"]["valid_values"]["value"]
             item_fields = item.properties["fields"]
 
             snapshot_type = item_fields["snapshot_type"]
 
             if snapshot_type not in existing_asset_types:
-                existing_asset_types.append(snapshot_type)
-                try:
-                    # update the schema for sg_asset_type
-                    return self.sgtk.shotgun.schema_field_update("Asset", "sg_asset_type",
-                                                                 {"valid_values": existing_asset_types})
-                except Exception as e:
-                    self.logger.error(
-                        "failed to updated sg_asset_type schema for item: %s" % item.name,
-                        extra={
-                            "action_show_more_info": {
-                                "label": "Show Error Log",
-                                "tooltip": "Show the error log",
-                                "text": traceback.format_exc()
-                            }
-                        }
-                    )
-                    return None
+                asset_types = [snapshot_type]
+
+                # add the asset types of the other Asset linked items of this plugin, in the same update.
+                for other_item, other_settings in self._get_accepted_items(item):
+                    other_fields = other_item.properties.get("fields") or {}
+                    if other_item is item or "snapshot_type" not in other_fields:
+                        continue
+                    try:
+                        if self._resolve_linked_entity_type(other_settings, other_item) == "Asset":
+                            asset_types.append(other_fields["snapshot_type"])
+                    except Exception:
+                        continue
+
+                status = self._schema_field_add_valid_values(item, "Asset", "sg_asset_type", asset_types)
+                if status is None:
+                    self.logger.error("failed to updated sg_asset_type schema for item: %s" % item.name)
+                return status
             else:
                 return False
 
-
     def _resolve_linked_entity_type(self, task_settings, item):
         """
         Resolve the entity that needs to be created for the item.
@@ -11,23 +11,47 @@
 # in-built modules
 import os
 import re
+import time
 import traceback
 import copy
+from multiprocessing.pool import ThreadPool
 
 # external modules
 from xml.dom import minidom
 
 # package modules
 import sgtk
+from sgtk import TankError
 
 HookBaseClass = sgtk.get_hook_baseclass()
 
+# Fields queried on the linked entities of a note, these are reused while creating the note.
+NOTE_LINK_FIELDS = {
+    "Version": ["entity", "sg_task", "cached_display_name", "project"],
+    "Task": ["entity", "project"],
+}
+
+DEFAULT_NOTE_LINK_FIELDS = ["cached_display_name", "project"]
+
+# Delay in seconds before the first retry of a failed attachment upload, doubled for every retry.
+UPLOAD_RETRY_BACKOFF = 2.0
+
 
 class UploadNotesPlugin(HookBaseClass):
     """
     Inherits from PublishFilesPlugin
     """
 
+    def __init__(self, parent, **kwargs):
+        """
+        Construction
+        """
+        # call base init
+        super(UploadNotesPlugin, self).__init__(parent, **kwargs)
+
+        # results of the bulk queries for every note item, consumed by validate.
+        self.__note_query_plan = dict()
+
     @property
     def settings_schema(self):
         """
@@ -85,6 +109,17 @@ class UploadNotesPlugin(HookBaseClass):
                     "for eg. 'name': ['cmp'] will ignore all values of name field that contain 'cmp' "
                 )
             },
+            "attachment_upload_workers": {
+                "type": "int",
+                "default_value": 4,
+                "description": "Number of attachments uploaded to SG in parallel."
+            },
+            "attachment_upload_retries": {
+                "type": "int",
+                "default_value": 3,
+                "description": "Number of times a failed attachment upload is retried, with exponential backoff. "
+                               "Uploads are only retried if the Note doesn't have the attachment yet."
+            },
         }
 
         # add tags also to publish files
@@ -105,48 +140,28 @@ class UploadNotesPlugin(HookBaseClass):
         wants to link to exists. It will create a note entity and upload the attachments (if any).
         """
 
-    def validate(self, task_settings, item):
+    def _get_note_link_queries(self, task_settings, item):
         """
-        Validates the given item to check that it is ok to publish.
-
-        Returns a boolean to indicate validity.
+        Resolves the note_links of the item to the queries needed to find their SG entities.
 
         :param task_settings: Dictionary of settings
         :param item: Item to process
-
-        :returns: True if item is valid, False otherwise.
+        :return: List of dicts with the following keys
+            note_link: Note link from the manifest.
+            entity_type: Entity type of the link.
+            status: "query" if the entity needs to be queried, "ignored" or "unknown" otherwise.
+            filters: SG filters to query the entity with, only for "query" status.
+            ignored_value: Value due to which the link was ignored, only for "ignored" status.
         """
 
         fields = item.properties.fields
-        status = True
-
-        sg_filters = [
-            ['project', 'is', item.context.project],
-            ['sg_client_note_id', 'is', item.properties.fields['sg_client_note_id']]
-        ]
-
-        # let's look for an existing notes entity.
-        result = self.sgtk.shotgun.find_one("Note", sg_filters)
-
-        if result:
-            self.logger.error(
-                "Found a Note with %d Client ID." % item.properties.fields['sg_client_note_id'],
-                extra={
-                    "action_show_in_shotgun": {
-                        "label": "Show Note",
-                        "tooltip": "Show Note in SG.",
-                        "entity": result
-                    }
-                }
-            )
-            return False
 
         entity_identifiers = task_settings.get("entity_identifiers").value
         ignored_identifiers = task_settings.get("ignored_identifiers").value
         # resolve the dicts in this list to SG entities.
         note_links = fields["note_links"]
 
-        item.properties.resolved_linked_entities = list()
+        link_queries = list()
 
         for note_link in note_links:
             entity_type = note_link.get("type")
@@ -228,41 +243,238 @@ class UploadNotesPlugin(HookBaseClass):
                         field_filter = [sg_field_name, relation, template_value]
                         entity_filter.append(field_filter)
 
-                    try:
-                        queried_entity = self.tank.shotgun.find_one(entity_type, entity_filter)
-                    except:
-                        status = False
-                        self.logger.error(
-                            "Couldn't find %s entity" % entity_type,
-                            extra={
-                                "action_show_more_info": {
-                                    "label": "Show Error",
-                                    "tooltip": "Show Error while querying entity",
-                                    "text": traceback.format_exc()
-                                }
+                    link_queries.append(dict(note_link=note_link, entity_type=entity_type,
+                                             status="query", filters=entity_filter))
+
+            elif is_ignored:
+                link_queries.append(dict(note_link=note_link, entity_type=entity_type,
+                                         status="ignored", ignored_value=ignored_value))
+
+            else:
+                link_queries.append(dict(note_link=note_link, entity_type=entity_type, status="unknown"))
+
+        return link_queries
+
+    def _get_note_items(self, item):
+        """
+        The checked note items accepted by this plugin, in the tree of the given item.
+
+        :param item: Item to process
+        :return: List of (note item, task_settings) tuples.
+        """
+        return [(note_item, note_settings) for note_item, note_settings in self._get_accepted_items(item)
+                if "note_links" in note_item.properties.get("fields", {})]
+
+    def _normalize_filter_value(self, value):
+        """
+        Normalizes a filter value, to match it against the value of a queried entity.
+        Entities are compared by type and id, and strings case insensitively, like SG does.
+        """
+        if isinstance(value, dict):
+            return value.get("type"), value.get("id")
+        elif isinstance(value, basestring):
+            return value.lower()
+        return value
+
+    def _plan_note_queries(self, task_settings, item):
+        """
+        Runs the queries of all the checked note items in the tree of the given item, in bulk.
+        Existing Notes are queried with a single find per project, and linked entities with a single find per
+        entity type and project. Filters that can't be combined are queried individually.
+        The results replace the query plan, and are consumed by validate for every item.
+
+        :param task_settings: Dictionary of settings
+        :param item: Item to process
+        """
+
+        sg = self.tank.shotgun
+
+        # plans left over from a previous validation, eg. for items that got unchecked, are discarded.
+        self.__note_query_plan.clear()
+
+        note_items = self._get_note_items(item)
+        if item not in [note_item for note_item, _ in note_items]:
+            note_items.append((item, task_settings))
+
+        # note item to it's (project id, client note id, link queries)
+        planned_items = dict()
+        for note_item, note_settings in note_items:
+            try:
+                planned_items[note_item] = (
+                    note_item.context.project["id"],
+                    note_item.properties.fields["sg_client_note_id"],
+                    self._get_note_link_queries(note_settings, note_item)
+                )
+            except Exception:
+                if note_item is item:
+                    raise
+                # this item will report the error during it's own validation.
+                self.logger.debug("Unable to plan the queries for %s\n%s" % (note_item.name, traceback.format_exc()))
+
+        # let's look for the existing notes entities.
+        client_note_ids = dict()
+        for project_id, client_note_id, _ in planned_items.itervalues():
+            client_note_ids.setdefault(project_id, set()).add(client_note_id)
+
+        existing_notes = dict()
+        for project_id, note_ids in client_note_ids.iteritems():
+            sg_filters = [
+                ['project', 'is', {"type": "Project", "id": project_id}],
+                ['sg_client_note_id', 'in', list(note_ids)]
+            ]
+            for sg_note in sg.find("Note", sg_filters, ["sg_client_note_id"]):
+                existing_notes[(project_id, sg_note["sg_client_note_id"])] = sg_note
+
+        # group the link queries that only use "is" filters by entity type and project.
+        grouped_queries = dict()
+        for _, _, link_queries in planned_items.itervalues():
+            for link_query in link_queries:
+                if link_query["status"] != "query":
+                    continue
+
+                project_filter = link_query["filters"][0]
+                field_filters = link_query["filters"][1:]
+                if field_filters and all(field_filter[1] == "is" for field_filter in field_filters):
+                    group_key = (link_query["entity_type"], project_filter[2]["id"])
+                    grouped_queries.setdefault(group_key, list()).append(link_query)
+                else:
+                    self._run_note_link_query(link_query)
+
+        for (entity_type, project_id), link_queries in grouped_queries.iteritems():
+            query_fields = set(NOTE_LINK_FIELDS.get(entity_type, DEFAULT_NOTE_LINK_FIELDS))
+            field_names = set()
+            for link_query in link_queries:
+                field_names.update(field_filter[0] for field_filter in link_query["filters"][1:])
+            query_fields.update(field_names)
+
+            if len(field_names) == 1 and all(len(link_query["filters"]) == 2 for link_query in link_queries):
+                field_name = field_names.pop()
+                values = dict()
+                for link_query in link_queries:
+                    value = link_query["filters"][1][2]
+                    values.setdefault(self._normalize_filter_value(value), value)
+                values = values.values()
+                combined_filter = [field_name, "in", values]
+            else:
+                combined_filter = {
+                    "filter_operator": "any",
+                    "filters": [{"filter_operator": "all", "filters": link_query["filters"][1:]}
+                                for link_query in link_queries]
+                }
+
+            sg_filters = [["project", "is", {"type": "Project", "id": project_id}], combined_filter]
+
+            try:
+                sg_entities = sg.find(entity_type, sg_filters, list(query_fields))
+            except Exception:
+                for link_query in link_queries:
+                    link_query["error"] = traceback.format_exc()
+                continue
+
+            # match the queried entities back to their queries
+            for link_query in link_queries:
+                link_query["result"] = None
+                for sg_entity in sg_entities:
+                    if all(self._normalize_filter_value(sg_entity.get(field_filter[0])) ==
+                           self._normalize_filter_value(field_filter[2])
+                           for field_filter in link_query["filters"][1:]):
+                        link_query["result"] = sg_entity
+                        break
+
+        for note_item, (project_id, client_note_id, link_queries) in planned_items.iteritems():
+            self.__note_query_plan[note_item] = dict(
+                existing_note=existing_notes.get((project_id, client_note_id)),
+                link_queries=link_queries
+            )
+
+    def _run_note_link_query(self, link_query):
+        """
+        Runs a single link query, for the filters that can't be combined with other queries.
+
+        :param link_query: Link query, see _get_note_link_queries
+        """
+        query_fields = NOTE_LINK_FIELDS.get(link_query["entity_type"], DEFAULT_NOTE_LINK_FIELDS)
+        try:
+            link_query["result"] = self.tank.shotgun.find_one(link_query["entity_type"], link_query["filters"],
+                                                              query_fields)
+        except Exception:
+            link_query["error"] = traceback.format_exc()
+
+    def validate(self, task_settings, item):
+        """
+        Validates the given item to check that it is ok to publish.
+
+        Returns a boolean to indicate validity.
+
+        :param task_settings: Dictionary of settings
+        :param item: Item to process
+
+        :returns: True if item is valid, False otherwise.
+        """
+
+        status = True
+
+        # the queries for all the note items are run in bulk, by the first item that gets validated.
+        # every item consumes it's results, so that the next validation run queries SG again.
+        if item not in self.__note_query_plan:
+            self._plan_note_queries(task_settings, item)
+        query_plan = self.__note_query_plan.pop(item)
+
+        result = query_plan["existing_note"]
+
+        if result:
+            self.logger.error(
+                "Found a Note with %d Client ID." % item.properties.fields['sg_client_note_id'],
+                extra={
+                    "action_show_in_shotgun": {
+                        "label": "Show Note",
+                        "tooltip": "Show Note in SG.",
+                        "entity": result
+                    }
+                }
+            )
+            return False
+
+        entity_identifiers = task_settings.get("entity_identifiers").value
+        ignored_identifiers = task_settings.get("ignored_identifiers").value
+
+        item.properties.resolved_linked_entities = list()
+
+        for link_query in query_plan["link_queries"]:
+            entity_type = link_query["entity_type"]
+
+            if link_query["status"] == "query":
+                if "error" in link_query:
+                    status = False
+                    self.logger.error(
+                        "Couldn't find %s entity" % entity_type,
+                        extra={
+                            "action_show_more_info": {
+                                "label": "Show Error",
+                                "tooltip": "Show Error while querying entity",
+                                "text": link_query["error"]
                             }
-                        )
-                        queried_entity = None
-
-                    if queried_entity:
-                        item.properties.resolved_linked_entities.append(queried_entity)
-                    else:
-                        status = False
-                        self.logger.error(
-                            "Couldn't find %s entity" % entity_type,
-                            extra={
-                                "action_show_more_info": {
-                                    "label": "Show Filters",
-                                    "tooltip": "Show Filters user for querying entity",
-                                    "text": entity_filter
-                                }
+                        }
+                    )
+                elif link_query["result"]:
+                    item.properties.resolved_linked_entities.append(link_query["result"])
+                else:
+                    status = False
+                    self.logger.error(
+                        "Couldn't find %s entity" % entity_type,
+                        extra={
+                            "action_show_more_info": {
+                                "label": "Show Filters",
+                                "tooltip": "Show Filters user for querying entity",
+                                "text": link_query["filters"]
                             }
-                        )
+                        }
+                    )
 
-            elif is_ignored:
+            elif link_query["status"] == "ignored":
                 status = True
                 self.logger.warning(
-                    "Ignoring the value of %s for %s entity." % (ignored_value, entity_type),
+                    "Ignoring the value of %s for %s entity." % (link_query["ignored_value"], entity_type),
                     extra={
                         "action_show_more_info": {
                             "label": "Show Identifiers",
@@ -302,36 +514,168 @@ class UploadNotesPlugin(HookBaseClass):
     def _upload_attachments(self, task_settings, item):
         """
         Uploads any generic file attachments to Shotgun, parenting
-        them to the Note entity.
+        them to the Note entity. Attachments are uploaded on a pool of threads,
+        the results are logged from the calling thread as the uploads complete.
 
         :param task_settings:   The Note entity to attach the files to in SG.
         :param item:              A Shotgun API handle.
         """
+        file_paths = list()
         for file_path in item.properties.fields.get("attachments", []):
             if os.path.exists(file_path):
-                self._upload_file(task_settings, item, file_path)
+                file_paths.append(file_path)
             else:
                 self.logger.warning(
                     "File does not exist and will not be uploaded: %s" % file_path
                 )
 
+        if not file_paths:
+            return
+
+        workers = max(1, min(task_settings.get("attachment_upload_workers").value or 1, len(file_paths)))
+        total_bytes = sum(os.path.getsize(file_path) for file_path in file_paths)
+
+        self.logger.info(
+            "Uploading %d attachments (%s bytes)..." % (len(file_paths), total_bytes)
+        )
+
+        def upload(file_path):
+            # nothing is logged from the worker threads, the log handlers of the publisher update the UI.
+            return (file_path,) + self._upload_file_with_retry(task_settings, item, file_path)
+
+        start_time = time.time()
+        results = list()
+
+        pool = ThreadPool(workers)
+        try:
+            for file_path, error, failed_attempts in pool.imap_unordered(upload, file_paths):
+                results.append((file_path, error))
+                for attempt_error in failed_attempts:
+                    self.logger.warning(
+                        "Upload failed for %s, it was retried." % file_path,
+                        extra={
+                            "action_show_more_info": {
+                                "label": "Show Error Log",
+                                "tooltip": "Show the error log",
+                                "text": attempt_error
+                            }
+                        }
+                    )
+                self._log_upload_progress(len(results), len(file_paths), file_path)
+        finally:
+            pool.close()
+            pool.join()
+
+        elapsed_time = max(time.time() - start_time, 0.001)
+
+        failures = [(file_path, error) for file_path, error in results if error]
+        uploaded_bytes = total_bytes - sum(os.path.getsize(file_path) for file_path, _ in failures)
+
+        self.logger.info(
+            "Uploaded %d of %d attachments (%s bytes) in %.1fs, %.2f MB/s." % (
+                len(file_paths) - len(failures), len(file_paths), uploaded_bytes, elapsed_time,
+                uploaded_bytes / elapsed_time / (1024 * 1024))
+        )
+
+        if failures:
+            self.logger.error(
+                "Failed to upload %d attachments for %s" % (len(failures), item.name),
+                extra={
+                    "action_show_more_info": {
+                        "label": "Show Error Log",
+                        "tooltip": "Show the error log",
+                        "text": "\n".join("%s\n%s" % failure for failure in failures)
+                    }
+                }
+            )
+            raise TankError("Failed to upload attachments: %s" % ", ".join(f[0] for f in failures))
+
+    def _upload_file_with_retry(self, task_settings, item, file_path):
+        """
+        Uploads a file attachment, retrying with an exponential backoff if the upload fails.
+        A failed upload may still have created the Attachment, so it is only retried if the Note
+        doesn't have the attachment yet.
+        This runs in a worker thread, so nothing is logged here.
+
+        :param task_settings:   The Note entity to attach the files to in SG.
+        :param item:              A Shotgun API handle.
+        :param file_path:       The path to the file to upload to SG.
+        :return: Tuple of (error log of the last attempt or None if the upload succeeded,
+            list of the error logs of the attempts that were retried)
+        """
+        retries = task_settings.get("attachment_upload_retries").value or 0
+        failed_attempts = list()
+
+        for attempt in range(retries + 1):
+            try:
+                if not attempt or not self._attachment_exists(item, file_path):
+                    self._upload_file(task_settings, item, file_path)
+                return None, failed_attempts
+            except Exception:
+                error = traceback.format_exc()
+                if attempt < retries:
+                    failed_attempts.append(error)
+                    time.sleep(UPLOAD_RETRY_BACKOFF * (2 ** attempt))
+
+        return error, failed_attempts
+
+    def _attachment_exists(self, item, file_path):
+        """
+        Checks if the Note of the item already has an attachment for the file, eg. when a failed upload
+        actually reached SG.
+        This runs in a worker thread.
+
+        :param item:              A Shotgun API handle.
+        :param file_path:       The path to the file uploaded to SG.
+        :return: True if the Note has an attachment with the same file name and size.
+        """
+        sg_filters = [
+            ["attachment_links", "is", {"type": item.properties.sg_note_data["type"],
+                                        "id": item.properties.sg_note_data["id"]}],
+            ["original_fname", "is", os.path.basename(file_path)],
+            ["file_size", "is", os.path.getsize(file_path)],
+        ]
+        return bool(self.tank.shotgun.find_one("Attachment", sg_filters))
+
     def _upload_file(self, task_settings, item, file_path):
         """
         Uploads any generic file attachments to Shotgun, parenting
         them to the Note entity.
+        This runs in a worker thread, a hook deriving from this one can override it to stub the upload.
 
         :param task_settings:   The Note entity to attach the files to in SG.
         :param item:              A Shotgun API handle.
         :param file_path:       The path to the file to upload to SG.
         """
-        self.logger.info(
-            "Uploading attachments (%s bytes)..." % os.path.getsize(file_path)
-        )
-        # upload to the notes entity
+        # tk.shotgun hands out a connection per thread.
         self.tank.shotgun.upload(item.properties.sg_note_data["type"],
                                  item.properties.sg_note_data["id"],
                                  str(file_path))
-        self.logger.info("Upload complete!")
+
+    def _log_upload_progress(self, completed, total, file_path):
+        """
+        Logs the progress of the attachment uploads, from the calling thread.
+
+        :param completed: Number of attachments processed so far
+        :param total: Total number of attachments
+        :param file_path: The path to the last processed file
+        """
+        self.logger.info("Attachments %d/%d: %s" % (completed, total, os.path.basename(file_path)))
+
+    def _get_note_link_entity(self, entity_link):
+        """
+        Returns the linked entity with the fields needed to create the note.
+        The entities resolved during validation already have these fields, SG is only queried otherwise.
+
+        :param entity_link: Linked entity resolved during validation.
+        :return: Entity with the NOTE_LINK_FIELDS of it's type.
+        """
+        query_fields = NOTE_LINK_FIELDS.get(entity_link["type"], DEFAULT_NOTE_LINK_FIELDS)
+
+        if all(field in entity_link for field in query_fields):
+            return entity_link
+
+        return self.tank.shotgun.find_one(entity_link["type"], [["id", "is", entity_link["id"]]], query_fields)
 
     def publish(self, task_settings, item):
         """
@@ -356,11 +700,7 @@ class UploadNotesPlugin(HookBaseClass):
                 # if we are adding a note to a version, link it with the version
                 # and the entity that the version is linked to.
                 # if the version has a task, link the task to the note too.
-                sg_version = sg.find_one(
-                    "Version",
-                    [["id", "is", entity_link["id"]]],
-                    ["entity", "sg_task", "cached_display_name", "project"]
-                )
+                sg_version = self._get_note_link_entity(entity_link)
 
                 # first make a sg link to the current entity - this to ensure we have a name key present
                 note_links += [{"id": entity_link["id"],
@@ -377,11 +717,7 @@ class UploadNotesPlugin(HookBaseClass):
             elif entity_link["type"] == "Task":
                 # if we are adding a note to a task, link the note to the entity that is linked to the
                 # task. The link the task to the note via the task link.
-                sg_task = sg.find_one(
-                    "Task",
-                    [["id", "is", entity_link["id"]]],
-                    ["entity", "project"]
-                )
+                sg_task = self._get_note_link_entity(entity_link)
 
                 if sg_task["entity"]:
                     # there is an entity link from this task
@@ -394,9 +730,7 @@ class UploadNotesPlugin(HookBaseClass):
                 # no special logic. Just link the note to the current entity.
                 # note that because we don't have the display name for the entity,
                 # we need to retrieve this
-                sg_entity = sg.find_one(entity_link["type"],
-                                        [["id", "is", entity_link["id"]]],
-                                        ["cached_display_name", "project"])
+                sg_entity = self._get_note_link_entity(entity_link)
                 note_links += [{"id": entity_link["id"],
                                 "type": entity_link["type"],
                                 "name": sg_entity["cached_display_name"]}]
@@ -9,11 +9,13 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import re
 import glob
 import random
+from multiprocessing.pool import ThreadPool
+
 import nuke
 import sgtk
-import fnmatch
 from dd.runtime import api
 api.load("frangetools")
 import frangetools
@@ -25,6 +27,18 @@ HookBaseClass = sgtk.get_hook_baseclass()
 
 USER_FILE_SETTING_NAME = "Error On User File"
 
+# Maximum number of paths sent in a single sg_path_to_source "in" filter
+COUNTERPART_QUERY_CHUNK_SIZE = 200
+
+# Maximum number of counterpart queries run concurrently
+COUNTERPART_QUERY_WORKERS = 4
+
+# Frame tokens in a file name, eg. %04d, %d, ####, @@@@
+FRAME_TOKEN_REGEX = re.compile(r"%0?(\d*)d|#+|@+")
+
+# Literal frame number right before the extension, eg. name.1001.exr
+LITERAL_FRAME_REGEX = re.compile(r"(?<=\.)(\d+)(?=\.[^./]+$)")
+
 
 class DisplayUnpublishedFiles(QtWidgets.QWidget):
     def __init__(self, message, unpublished, gif_path):
@@ -102,6 +116,52 @@ class DisplayUnpublishedFiles(QtWidgets.QWidget):
         self.main_dialog.exec_()
 
 
+class ValidPathPolicy(object):
+    """
+    Classifies the paths loaded in a nuke script as published, unpublished or invalid.
+    The valid roots are compiled once into a single anchored regex.
+    """
+    PUBLISHED = "published"
+    UNPUBLISHED = "unpublished"
+    INVALID = "invalid"
+
+    def __init__(self, dd_root, show_path):
+        self.show_path = os.path.normpath(show_path)
+        library_path = os.path.normpath(os.path.join(dd_root, 'library'))
+
+        # used for reporting
+        self.valid_paths = {
+            'dd_library': os.path.join(library_path, '**'),  # dd library path
+            'shot_pub': os.path.join(self.show_path, '<seq>[/<shot>]', 'SHARED', '*'),  # seq/shot published
+            'show_pub': os.path.join(self.show_path, 'SHARED', '*'),  # show published
+        }
+
+        # dd library, show SHARED, sequence SHARED and shot SHARED
+        self._valid_regex = re.compile(r"^(?:{library}/|{show}/(?:[^/]+/){{0,2}}SHARED/).+$".format(
+            library=re.escape(library_path), show=re.escape(self.show_path)))
+        self._show_prefix = self.show_path + "/"
+
+    def classify(self, file_path):
+        """
+        :param file_path: Path to classify
+        :return: PUBLISHED if the path is in a valid location, UNPUBLISHED if it's elsewhere in the show,
+        INVALID otherwise.
+        """
+        file_path = os.path.normpath(file_path)
+        if self._valid_regex.match(file_path):
+            return self.PUBLISHED
+        elif file_path.startswith(self._show_prefix):
+            return self.UNPUBLISHED
+        return self.INVALID
+
+    def classify_paths(self, file_paths):
+        """
+        :param file_paths: Paths to classify
+        :return: Dictionary of path to it's verdict
+        """
+        return {file_path: self.classify(file_path) for file_path in file_paths}
+
+
 class NukePublishDDValidationPlugin(HookBaseClass):
     """
     Inherits from NukePublishFilesPlugin
@@ -113,6 +173,9 @@ class NukePublishDDValidationPlugin(HookBaseClass):
         # call base init
         super(NukePublishDDValidationPlugin, self).__init__(parent, **kwargs)
         self._breakdown_app = self.parent.engine.apps.get('tk-multi-breakdown')
+        self._path_policy = None
+        # published counterparts found in this session, per show, keyed by sg_path_to_source and canonical path
+        self._published_counterparts = dict()
 
     @property
     def settings_schema(self):
@@ -159,6 +222,48 @@ class NukePublishDDValidationPlugin(HookBaseClass):
         return dict((d[key], dict(d, index=index)) for (index, d) in enumerate(seq))
 
 
+    def _get_render_dir_snapshot(self, item, directory):
+        """
+        Lists a render directory once per validation run, the listing is shared by all the write nodes.
+
+        :param item: Write node item being validated
+        :param directory: Render directory
+        :return: Set of file names in the directory
+        """
+        session_item = item.parent
+        if 'render_dir_snapshots' not in session_item.properties:
+            session_item.properties['render_dir_snapshots'] = dict()
+        snapshots = session_item.properties['render_dir_snapshots']
+
+        if directory not in snapshots:
+            try:
+                snapshots[directory] = frozenset(os.listdir(directory))
+            except OSError:
+                snapshots[directory] = frozenset()
+        return snapshots[directory]
+
+    def _get_rendered_frames(self, item, file_path):
+        """
+        Gets the frames rendered on disk for a sequence path, from the render directory snapshot.
+
+        :param item: Write node item being validated
+        :param file_path: Sequence path, eg. /path/name.%04d.exr or /path/name.####.exr
+        :return: Set of frame numbers, None if the path is not a frame sequence
+        """
+        dir_name, file_name = os.path.split(file_path)
+        match = FRAME_TOKEN_REGEX.search(file_name)
+        if not match:
+            return None
+
+        token = match.group(0)
+        padding = len(token) if token[0] in "#@" else int(match.group(1) or 0)
+        frame_pattern = r"(\d{%d,})" % padding if padding else r"(\d+)"
+        frame_regex = re.compile(re.escape(file_name[:match.start()]) + frame_pattern +
+                                 re.escape(file_name[match.end():]) + "$")
+
+        matches = (frame_regex.match(name) for name in self._get_render_dir_snapshot(item, dir_name))
+        return set(int(m.group(1)) for m in matches if m)
+
     def _framerange_to_be_published(self, item):
         """
         Since users have the option to render only a subset of frames,
@@ -168,14 +273,25 @@ class NukePublishDDValidationPlugin(HookBaseClass):
         :return: True if yes false otherwise
         """
         lss_path = item.properties['node']['cached_path'].value()
-        lss_data = frangetools.getSequence(lss_path)
+        rendered_frames = self._get_rendered_frames(item, lss_path)
+
+        if rendered_frames is None:
+            # not a frame sequence, let frangetools figure it out
+            lss_data = frangetools.getSequence(lss_path)
+
+            # Since lss_data will be a list of dictionaries,
+            # building a dictionary from key value for the ease of fetching data.
+            info_by_path = self._build_dict(lss_data, key="path")
+            missing_frames = info_by_path.get(lss_path)['missing_frames']
+            first_rendered_frame, last_rendered_frame = info_by_path.get(lss_path)['frame_range'][:2]
+        elif rendered_frames:
+            first_rendered_frame, last_rendered_frame = min(rendered_frames), max(rendered_frames)
+            missing_frames = set(xrange(first_rendered_frame, last_rendered_frame + 1)) - rendered_frames
+        else:
+            # nothing rendered on disk
+            missing_frames = True
 
         log_method = item.properties.get("log_method", "warning")
-
-        # Since lss_data will be a list of dictionaries,
-        # building a dictionary from key value for the ease of fetching data.
-        info_by_path = self._build_dict(lss_data, key="path")
-        missing_frames = info_by_path.get(lss_path)['missing_frames']
         root = nuke.Root()
 
         # If there are no missing frames, then checking if the first and last frames match with root first and last
@@ -192,9 +308,6 @@ class NukePublishDDValidationPlugin(HookBaseClass):
                              "\nRenders Mismatch! Incomplete renders on disk.")
             return False if log_method == "error" else True
         else:
-            first_rendered_frame = info_by_path.get(lss_path)['frame_range'][0]
-            last_rendered_frame = info_by_path.get(lss_path)['frame_range'][1]
-
             if (first_rendered_frame > root.firstFrame()) or (last_rendered_frame < root.lastFrame()):
                 log("Renders Mismatch! Incomplete renders on disk.")
                 if log_method == "warning":
@@ -209,60 +322,188 @@ class NukePublishDDValidationPlugin(HookBaseClass):
                 return False if log_method == "error" else True
         return True
 
-    def _collect_file_nodes_in_graph(self, node, visited_files):
+    def _build_upstream_file_index(self, nodes):
         """
-        Traverses the graph for the write node being validated and collects all the
-        nodes with file knobs and their respective file values
+        Walks the graph upstream of the given nodes once, and collects for every one of them
+        all the upstream nodes with active file knobs.
+        The walk is iterative, and the upstream file nodes of every node visited are memoized and shared
+        by all the nodes downstream of it.
+
+        :param nodes: The nodes to collect upstream file nodes for, usually the write nodes
+        :return: Dictionary of node to the set of upstream file nodes, for all the nodes visited
+        """
+        upstream_file_nodes = dict()
+        dependencies = dict()
+        in_progress = set()
+
+        for start_node in nodes:
+            stack = [(start_node, False)]
+            while stack:
+                node, expanded = stack.pop()
+                if node in upstream_file_nodes:
+                    continue
+
+                if not expanded:
+                    # guard against cycles in the graph
+                    if node in in_progress:
+                        continue
+                    in_progress.add(node)
+                    dependencies[node] = node.dependencies() or []
+                    # process the node after all of it's dependencies
+                    stack.append((node, True))
+                    stack.extend((dep, False) for dep in dependencies[node] if dep not in upstream_file_nodes)
+                else:
+                    file_nodes = set()
+                    if self._contains_active_file_knob(node):
+                        file_nodes.add(node)
+                    for dep in dependencies.pop(node):
+                        file_nodes.update(upstream_file_nodes.get(dep, ()))
+                    upstream_file_nodes[node] = frozenset(file_nodes)
+                    in_progress.discard(node)
+
+        return upstream_file_nodes
 
-        :param node: The node being visited in the graph
-        :param visited_files: Dictionary of nodes and associated files
+    def _collect_file_nodes_in_graph(self, item):
+        """
+        Collects all the nodes with file knobs upstream of the write node being validated,
+        and their respective file values.
+        The upstream file nodes of all the write nodes are collected in a single walk of the script,
+        per validation run.
+
+        :param item: Write node item being validated
         :return: Dictionary of all the file nodes in the graph and associated files
         """
-        if self.visited_dict[node] == 0:
+        session_item = item.parent
+        if 'upstream_file_nodes' not in session_item.properties:
+            write_nodes = [child.properties['node'] for child in session_item.children
+                           if child.properties.get('node')]
+            upstream_file_nodes = self._build_upstream_file_index(write_nodes)
+            session_item.properties['upstream_file_nodes'] = {node: upstream_file_nodes[node]
+                                                              for node in write_nodes}
+
+        node = item.properties['node']
+        file_nodes = session_item.properties['upstream_file_nodes'].get(node)
+        if file_nodes is None:
+            file_nodes = self._build_upstream_file_index([node])[node]
+
+        visited_files = {}
+        for file_node in sorted(file_nodes, key=lambda n: n.fullName()):
             # get the file path if exists
-            if self._contains_active_file_knob(node):
-                node_file_path = node['file'].value()
-                if node_file_path:
-                    visited_files.setdefault(node_file_path, []).append(nuke.Node.fullName(node))
-            # set visited to 1 for the node so as not to revisit
-            self.visited_dict[node] = 1
-            dep = node.dependencies()
-            if dep:
-                for item in dep:
-                    self._collect_file_nodes_in_graph(item, visited_files)
+            node_file_path = file_node['file'].value()
+            if node_file_path:
+                visited_files.setdefault(node_file_path, []).append(file_node.fullName())
 
         return visited_files
 
+    def _get_path_policy(self):
+        """
+        Returns the valid path policy for the current show, compiled once per show.
+
+        :return: ValidPathPolicy instance
+        """
+        show_path = os.path.join(os.environ['DD_SHOWS_ROOT'], os.environ['DD_SHOW'])
+        if not self._path_policy or self._path_policy.show_path != os.path.normpath(show_path):
+            self._path_policy = ValidPathPolicy(os.environ['DD_ROOT'], show_path)
+        return self._path_policy
+
     @staticmethod
-    def _check_file_validity(visited_files, suspicious_paths, valid_paths, show_path):
+    def _check_file_validity(visited_files, suspicious_paths, path_policy):
         """
         Checks for unpublished and invalid paths in files collected after graph traversal
         :param visited_files: File nodes and associated files collected during traversal
         :param suspicious_paths: Dict to capture unpublished/invalid paths
-        :param valid_paths: Dict with all the valid paths for a particular show
-        :param show_path: Show path i.e /dd/shows/<SHOW>
+        :param path_policy: ValidPathPolicy for the show
         :return: Suspicious files found among the visited files
         """
-        for file_path in visited_files:
-            valid_patterns = [pattern for pattern in valid_paths.itervalues()]
-            matches_valid_pattern = any([fnmatch.fnmatch(file_path, pattern) for pattern in valid_patterns])
-            if show_path in file_path and not matches_valid_pattern:
-                suspicious_paths['unpublished'].append(file_path)
-            elif show_path not in file_path and not matches_valid_pattern:
-                suspicious_paths['invalid'].append(file_path)
+        for file_path, verdict in path_policy.classify_paths(visited_files).iteritems():
+            if verdict != ValidPathPolicy.PUBLISHED:
+                suspicious_paths[verdict].append(file_path)
         return suspicious_paths
 
+    @staticmethod
+    def _get_sequence_path_variants(file_path):
+        """
+        Normalizes a file path to a canonical form, where the frame number or frame token is replaced by %0Nd.
+        Also returns the frame token variants the path could have been published with.
+
+        :param file_path: File path, eg. /path/name.####.exr, /path/name.%04d.exr or /path/name.1001.exr
+        :return: Tuple of (canonical path, list of path variants)
+        """
+        dir_name, file_name = os.path.split(file_path)
+
+        match = FRAME_TOKEN_REGEX.search(file_name)
+        if match:
+            token = match.group(0)
+            padding = len(token) if token[0] in "#@" else int(match.group(1) or 0)
+        else:
+            match = LITERAL_FRAME_REGEX.search(file_name)
+            if not match:
+                return file_path, [file_path]
+            padding = len(match.group(0))
+
+        prefix, suffix = file_name[:match.start()], file_name[match.end():]
+        padded_token = "%0{}d".format(padding) if padding else "%d"
+        canonical_path = os.path.join(dir_name, prefix + padded_token + suffix)
+
+        variants = [file_path, canonical_path]
+        if padding:
+            variants.append(os.path.join(dir_name, prefix + "#" * padding + suffix))
+        return canonical_path, list(set(variants))
+
     def _get_published_counterparts(self, unpublished_files):
         """
-        Query shotgun and get published counterparts of the unpublished files
+        Query shotgun and get published counterparts of the unpublished files.
+        Paths are matched on their canonical form, so that frame token variants match too.
+        The queries are chunked and run concurrently, and the results are cached per show for the session.
 
         :param unpublished_files: Unpublished files in the nuke script
-        :return: Queried sg data for files which have published versions
+        :return: Queried sg data for files which have published versions, keyed by the unpublished file
         """
-        filters = [["project.Project.name", "is", os.environ['DD_SHOW']], ['sg_path_to_source', 'in', unpublished_files]]
-        fields = ['path', 'entity', 'task'] + self._breakdown_app.get_setting('additional_publish_fields')
-        sg_data = self.parent.engine.shotgun.find('PublishedFile', filters, fields)
-        sg_data = {entity['sg_path_to_source']: entity for entity in sg_data}
+        show = os.environ['DD_SHOW']
+        show_counterparts = self._published_counterparts.setdefault(show, dict())
+
+        canonical_paths = dict()
+        query_paths = set()
+        for file_path in unpublished_files:
+            canonical_path, variants = self._get_sequence_path_variants(file_path)
+            canonical_paths[file_path] = canonical_path
+            if file_path not in show_counterparts and canonical_path not in show_counterparts:
+                query_paths.update(variants)
+
+        if query_paths:
+            query_paths = sorted(query_paths)
+            chunks = [query_paths[index:index + COUNTERPART_QUERY_CHUNK_SIZE]
+                      for index in range(0, len(query_paths), COUNTERPART_QUERY_CHUNK_SIZE)]
+            fields = ['path', 'entity', 'task', 'sg_path_to_source'] + \
+                self._breakdown_app.get_setting('additional_publish_fields')
+
+            def query_chunk(chunk):
+                filters = [["project.Project.name", "is", show], ['sg_path_to_source', 'in', chunk]]
+                return self.parent.engine.shotgun.find('PublishedFile', filters, fields)
+
+            if len(chunks) == 1:
+                results = [query_chunk(chunks[0])]
+            else:
+                pool = ThreadPool(min(COUNTERPART_QUERY_WORKERS, len(chunks)))
+                try:
+                    results = pool.map(query_chunk, chunks)
+                finally:
+                    pool.close()
+                    pool.join()
+
+            for sg_data in results:
+                for entity in sg_data:
+                    canonical_path = self._get_sequence_path_variants(entity['sg_path_to_source'])[0]
+                    show_counterparts[entity['sg_path_to_source']] = entity
+                    show_counterparts.setdefault(canonical_path, entity)
+
+        sg_data = dict()
+        for file_path, canonical_path in canonical_paths.iteritems():
+            # exact matches take priority over frame token variants
+            if file_path in show_counterparts:
+                sg_data[file_path] = show_counterparts[file_path]
+            elif canonical_path in show_counterparts:
+                sg_data[file_path] = show_counterparts[canonical_path]
         return sg_data
 
     def _rewire_script_and_report(self, suspicious_paths, visited_files, sg_data, display_files):
@@ -380,14 +621,8 @@ class NukePublishDDValidationPlugin(HookBaseClass):
         """
         status = True
         logger_method = None
-        self.visited_dict = item.parent.properties['visited_dict']
 
-        show_path = os.path.join(os.environ['DD_SHOWS_ROOT'], os.environ['DD_SHOW'])
-        valid_paths = {
-            'dd_library': os.path.join(os.environ['DD_ROOT'], 'library', '**'),  # dd library path
-            'shot_pub': os.path.join(show_path, '**', 'SHARED', '*'),  # shot published glob
-            'show_pub': os.path.join(show_path, 'SHARED', '*'),  # show published glob
-        }
+        path_policy = self._get_path_policy()
 
         # Collect all the nodes associated with a write node
         # For all the read, readgeo and camera nodes present in the write node graph, check for 'file' knob.
@@ -396,10 +631,8 @@ class NukePublishDDValidationPlugin(HookBaseClass):
             'unpublished': [],
             'invalid': [],
         }
-        visited_files = {}
-        self._collect_file_nodes_in_graph(item.properties['node'], visited_files)
-        self._check_file_validity(visited_files, suspicious_paths, valid_paths, show_path)
-        item.parent.properties['visited_dict'] = self.visited_dict
+        visited_files = self._collect_file_nodes_in_graph(item)
+        self._check_file_validity(visited_files, suspicious_paths, path_policy)
 
         if suspicious_paths['unpublished']:
             unpublished = ""
@@ -458,7 +691,7 @@ class NukePublishDDValidationPlugin(HookBaseClass):
                                   "action_show_more_info": {
                                       "label": "Show Info",
                                       "tooltip": "Show invalid path(s)",
-                                      "text": "Paths not in {}: {}".format(valid_paths.values(), paths)
+                                      "text": "Paths not in {}: {}".format(path_policy.valid_paths.values(), paths)
                                   }
                               }
                               )
@@ -492,15 +725,14 @@ class NukePublishDDValidationPlugin(HookBaseClass):
                                     "Not validating frame range.")
                 return True
 
-            sg_entity_type = entity["type"]
-            sg_filters = [["id", "is", entity["id"]]]
             in_field = frame_range_app.get_setting("sg_in_frame_field")
             out_field = frame_range_app.get_setting("sg_out_frame_field")
             fields = [in_field, out_field]
 
             # get the field information from shotgun based on Shot
             # sg_cut_in and sg_cut_out info will be on Shot entity, so skip in case this info is not present
-            data = self.sgtk.shotgun.find_one(sg_entity_type, filters=sg_filters, fields=fields)
+            sg_filters = [["id", "is", entity["id"]]]
+            data = self.sgtk.shotgun.find_one(entity["type"], filters=sg_filters, fields=fields) or {}
             if in_field not in data or out_field not in data:
                 return True
             elif data[in_field] is None or data[out_field] is None:
@@ -541,13 +773,43 @@ class NukePublishDDValidationPlugin(HookBaseClass):
             return False
         return True
 
+    def _build_output_path_index(self, session_item):
+        """
+        Builds an index of the output paths of all the write nodes in the session, in a single pass.
+        Paths are normalized and their frame tokens canonicalized, so /path/name.####.exr and
+        /path/name.%04d.exr collide.
+
+        :param session_item: nuke.session item
+        :return: Dictionary of canonical output path to the full names of all the nodes writing there
+        """
+        output_path_index = dict()
+        for child in session_item.children:
+            node = child.properties.get('node')
+            if not node:
+                continue
+            node_path = os.path.normpath(node['cached_path'].value())
+            canonical_path = self._get_sequence_path_variants(node_path)[0]
+            output_path_index.setdefault(canonical_path, []).append(node.fullName())
+        return output_path_index
+
     def _write_node_path_duplicacy(self, item):
-        node_path = item.properties['node']['cached_path'].value()
-        node_name = item.properties['node'].name()
-        all_paths = item.parent.properties['write_node_paths_dict'].values()
-        if node_path in all_paths:
-            duplicate_path_node = [key for (key, value) in item.parent.properties['write_node_paths_dict'].items()
-                                   if value == node_path]
+        """
+        Checks whether any other write node in the script writes to the same output path.
+
+        :param item: Write node item being validated
+        :return: True if the output path is unique false otherwise
+        """
+        session_item = item.parent
+        if 'write_node_paths_dict' not in session_item.properties:
+            session_item.properties['write_node_paths_dict'] = self._build_output_path_index(session_item)
+
+        node_path = os.path.normpath(item.properties['node']['cached_path'].value())
+        # full names, nodes inside groups can have the same name as nodes at the root
+        node_name = item.properties['node'].fullName()
+        canonical_path = self._get_sequence_path_variants(node_path)[0]
+        same_path_nodes = session_item.properties['write_node_paths_dict'].get(canonical_path, [])
+        duplicate_path_node = [name for name in same_path_nodes if name != node_name]
+        if duplicate_path_node:
             self.logger.error("Duplicate output path.",
                               extra={
                                   "action_show_more_info": {
@@ -559,7 +821,6 @@ class NukePublishDDValidationPlugin(HookBaseClass):
                               }
                               )
             return False
-        item.parent.properties['write_node_paths_dict'] = {node_name: node_path}
         return True
 
     @staticmethod
@@ -582,11 +843,12 @@ class NukePublishDDValidationPlugin(HookBaseClass):
         status = True
         # Segregating the checks, specifically for general nuke script
         if item.type == 'nuke.session':
+            # Properties cached for a single validation run, shotgun and the script are queried again on every run
+            item.properties.pop('upstream_file_nodes', None)
+            item.properties.pop('render_dir_snapshots', None)
+            item.properties.pop('write_node_paths_dict', None)
             status = self._non_sgtk_writes() and status
             status = self._sync_frame_range(item) and status
-            # Properties to be used by child write nodes
-            item.properties['visited_dict'] = {node: 0 for node in nuke.allNodes(recurseGroups=True)}
-            item.properties['write_node_paths_dict'] = dict()
 
         # Segregating the checks, specifically for write nodes
         if item.properties.get("node"):
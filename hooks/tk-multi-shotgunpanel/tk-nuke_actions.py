@@ -16,10 +16,12 @@ import os
 import re
 import glob
 
-from code.nuke_preferences import NukePreferences
-
 HookBaseClass = sgtk.get_hook_baseclass()
 
+# pipeline step short names, keyed by task id, shared by all the loads of the session
+TASK_STEP_SHORT_NAMES = dict()
+
+
 class CustomNukeActions(HookBaseClass):
     """
     Shotgun Panel Actions for Nuke
@@ -121,12 +123,7 @@ class CustomNukeActions(HookBaseClass):
 
         # to fetch the nuke prefs from pipeline
         step = self._find_pipe_step(path, sg_publish_data)
-        nuke_prefs = NukePreferences(step)
-
-        for knob_name, knob_value in nuke_prefs.getKnobOverridesGenerator(step):
-            if read_node.Class() in knob_name:
-                knob_name = knob_name.replace(read_node.Class(), read_node.name())
-                nuke.knob(knob_name, knob_value)
+        self._apply_knob_overrides(read_node, step)
 
         if seq_range:
             # override the detected frame range.
@@ -198,12 +195,7 @@ class CustomNukeActions(HookBaseClass):
 
         # to fetch the nuke prefs from pipeline
         step = self._find_pipe_step(path, sg_publish_data)
-        nuke_prefs = NukePreferences(step)
-
-        for knob_name, knob_value in nuke_prefs.getKnobOverridesGenerator(step):
-            if read_node.Class() in knob_name:
-                knob_name = knob_name.replace(read_node.Class(), read_node.name())
-                nuke.knob(knob_name, knob_value)
+        self._apply_knob_overrides(read_node, step)
 
         if seq_range:
             # override the detected frame range.
@@ -251,10 +243,36 @@ class CustomNukeActions(HookBaseClass):
                                        "\nto proxy template: {}".format(fields, proxy_template_name))
             return None
 
+    def _prefetch_pipe_steps(self, sg_publish_data_list):
+        """Helper method to fetch the pipeline steps of many publishes at once.
+
+        The step short names of all the tasks not cached yet are fetched with a single query.
+
+        Args:
+            sg_publish_data_list (list): Shotgun data dictionaries with all the standard publish fields.
+        """
+        task_ids = set()
+        for sg_publish_data in sg_publish_data_list:
+            task = sg_publish_data.get("task")
+            if task and task.get("id") not in TASK_STEP_SHORT_NAMES:
+                task_ids.add(task.get("id"))
+
+        if not task_ids:
+            return
+
+        filters = [["id", "in", list(task_ids)]]
+        fields = ["step.Step.short_name"]
+        for task in self.sgtk.shotgun.find("Task", filters, fields):
+            TASK_STEP_SHORT_NAMES[task["id"]] = task.get("step.Step.short_name")
+
+        # don't query again for tasks which couldn't be found
+        for task_id in task_ids:
+            TASK_STEP_SHORT_NAMES.setdefault(task_id, None)
+
     def _find_pipe_step(self, path, sg_publish_data):
         """Helper method to extract pipeline step from renders.
 
-        By extracting fields from the template path.
+        The step is looked up from the publish task, and cached per task for the session.
         
         Args:
             path (str): File path
@@ -268,24 +286,11 @@ class CustomNukeActions(HookBaseClass):
             return "asset"
         else:
             if sg_publish_data["task"]:
-                entity_type = sg_publish_data["task"].get("type")
-                filters = [["id", "is", sg_publish_data["task"].get("id")]]
-                fields = ["step"]
-                item = self.sgtk.shotgun.find_one(entity_type, filters, fields)
-
-                step = item.get("step", None)
-
-                # fetch the short_name of the task
-                entity_type = step.get("type")
-                filters = [["id", "is", step.get("id")]]
-                fields = ["short_name"]
-
-                step_info = self.sgtk.shotgun.find_one(entity_type, filters, fields)
+                task_id = sg_publish_data["task"].get("id")
+                if task_id not in TASK_STEP_SHORT_NAMES:
+                    self._prefetch_pipe_steps([sg_publish_data])
 
-                if step_info:
-                    return step_info.get("short_name")
-                else:
-                    return None
+                return TASK_STEP_SHORT_NAMES.get(task_id)
 
     def _find_sequence_range(self, path):
         """
@@ -18,10 +18,6 @@ from sgtk.platform.qt import QtGui
 
 HookClass = sgtk.get_hook_baseclass()
 
-from dd.runtime import api
-api.load("preferences")
-import preferences
-
 MAYA_TIME_UNITS = {15: 'game',
                    24: 'film',
                    25: 'pal',
@@ -156,10 +152,7 @@ class SceneOperation(HookClass):
         render_temp = self.get_render_template(context)
         frame_sq_key = context.sgtk.template_keys['SEQ']  # Can 'SEQ' change?
 
-        show_prefs = preferences.Preferences(pref_file_name="show_preferences.yaml",
-                                             role=fields.get("Step"),
-                                             seq_override=fields.get("Sequence"),
-                                             shot_override=fields.get("Shot"))
+        show_prefs = self.get_preferences("show_preferences.yaml", fields)
         # set fps
         try:
             fps = show_prefs["show_settings"]["fps"]
@@ -197,10 +190,7 @@ class SceneOperation(HookClass):
         else:
             fields.pop("extension")  # remove ma as extension to apply default img ext
             render_path = render_temp.apply_fields(fields)
-            maya_prefs = preferences.Preferences(pref_file_name="maya_preferences.yaml",
-                                                 role=fields.get("Step"),
-                                                 seq_override=fields.get("Sequence"),
-                                                 shot_override=fields.get("Shot"))
+            maya_prefs = self.get_preferences("maya_preferences.yaml", fields)
             self.set_render_settings(fields=fields,
                                      placeholder_render_path=render_path,
                                      frame_sq_key=frame_sq_key,
@@ -18,13 +18,11 @@ from sgtk.platform.qt import QtGui
 
 HookClass = sgtk.get_hook_baseclass()
 
-from dd.runtime import api
-
-api.load("preferences")
-import preferences
-
 SHOW_FORMAT_NAME = 'SHOW_FORMAT'
 
+# (width, height, pixel aspect ratio) of the show format registered in this session
+SHOW_FORMAT_VALUES = dict(values=None)
+
 class SceneOperation(HookClass):
     """
     Hook called to perform an operation with the
@@ -190,40 +188,75 @@ class SceneOperation(HookClass):
                 QtGui.QMessageBox.warning(None, "Entity has no in/out frame", warning_message)
 
     def set_show_preferences(self, fields):
-        show_prefs = preferences.Preferences(pref_file_name="show_preferences.yaml",
-                                             role=fields.get("Step"),
-                                             seq_override=fields.get("Sequence"),
-                                             shot_override=fields.get("Shot"))
+        show_prefs = self.get_preferences("show_preferences.yaml", fields)
 
         try:
+            width = show_prefs["show_settings"]["resolution"]["width"]
+            height = show_prefs["show_settings"]["resolution"]["height"]
             pixel_aspect_ratio = show_prefs["show_settings"]["resolution"].get("pixel_aspect_ratio")
 
-            if not pixel_aspect_ratio:
-                format_string = "{0} {1} {2}".format(show_prefs["show_settings"]["resolution"]["width"],
-                                                     show_prefs["show_settings"]["resolution"]["height"],
-                                                     SHOW_FORMAT_NAME)
-            else:
-                format_string = "{0} {1} {2} {3}".format(show_prefs["show_settings"]["resolution"]["width"],
-                                                         show_prefs["show_settings"]["resolution"]["height"],
-                                                         pixel_aspect_ratio,
-                                                         SHOW_FORMAT_NAME)
-
-            formats = nuke.formats()
-            for nuke_format in formats:
-                if nuke_format.name() == SHOW_FORMAT_NAME:
-                    nuke_format.setName('')
-            nuke.addFormat(format_string)
-            nuke.root().knob('format').setValue(SHOW_FORMAT_NAME)
+            show_format = self._register_show_format(width, height, pixel_aspect_ratio)
+            root_format = nuke.root().knob('format').value()
+            if root_format.name() != SHOW_FORMAT_NAME or not self._format_matches(root_format, show_format):
+                nuke.root().knob('format').setValue(show_format)
         except KeyError as ke:
             self.parent.logger.warning("Unable to find {} in show preferences. "
                                        "Not setting root format.".format(ke))
 
         try:
-            nuke.root().knob('fps').setValue(show_prefs["show_settings"]["fps"])
+            fps = show_prefs["show_settings"]["fps"]
+            if nuke.root().knob('fps').value() != fps:
+                nuke.root().knob('fps').setValue(fps)
         except KeyError as ke:
             self.parent.logger.warning("Unable to find {} in show preferences. "
                                        "Not setting fps.".format(ke))
 
+    def _register_show_format(self, width, height, pixel_aspect_ratio=None):
+        """
+        Registers the show format, unless the show format registered in this session is still there.
+        Any other format with the show format name, eg. from an opened script, is renamed.
+
+        :param width:               Format width
+        :param height:              Format height
+        :param pixel_aspect_ratio:  Format pixel aspect ratio, square pixels if None
+        :returns:                   Show format
+        """
+        values = (int(width), int(height), float(pixel_aspect_ratio or 1.0))
+
+        show_format = None
+        for nuke_format in nuke.formats():
+            if nuke_format.name() != SHOW_FORMAT_NAME:
+                continue
+            if not show_format and SHOW_FORMAT_VALUES["values"] == values and \
+                    self._format_matches(nuke_format, None, *values):
+                show_format = nuke_format
+            else:
+                # free the name for the show format
+                nuke_format.setName('')
+
+        if show_format:
+            return show_format
+
+        if not pixel_aspect_ratio:
+            format_string = "{0} {1} {2}".format(width, height, SHOW_FORMAT_NAME)
+        else:
+            format_string = "{0} {1} {2} {3}".format(width, height, pixel_aspect_ratio, SHOW_FORMAT_NAME)
+
+        SHOW_FORMAT_VALUES["values"] = values
+        return nuke.addFormat(format_string)
+
+    @staticmethod
+    def _format_matches(nuke_format, other_format=None, width=None, height=None, pixel_aspect_ratio=None):
+        """
+        Checks whether a format has the same resolution and pixel aspect ratio as another format,
+        or as the given values.
+        """
+        if other_format:
+            width, height, pixel_aspect_ratio = other_format.width(), other_format.height(), \
+                                                other_format.pixelAspect()
+        return (nuke_format.width() == int(width) and nuke_format.height() == int(height) and
+                nuke_format.pixelAspect() == float(pixel_aspect_ratio or 1.0))
+
     def set_environment_variables(self, fields):
         """
         Set Environment variables for current session
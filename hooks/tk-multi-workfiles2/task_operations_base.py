@@ -1,10 +1,68 @@
 
+import os
+import time
+import Queue
+import atexit
+import threading
+from collections import Mapping
+
 import sgtk
 
 from sgtk.platform.qt import QtGui
 
 HookClass = sgtk.get_hook_baseclass()
 
+# resolved preferences, shared by the scene operations of all the engines in this process
+# keyed by (pref_file_name, DD environment, role, seq_override, shot_override)
+# each entry holds the time it was resolved at, and a read-only view of the preferences
+PREFERENCES_CACHE = dict()
+
+# seconds before preferences are resolved again, to pick up preference changes
+PREFERENCES_CACHE_TTL = 300
+
+# task statuses, keyed by task id, refreshed in the background
+TASK_STATUS_CACHE = dict()
+# ids of the tasks with a status lookup in flight
+TASK_STATUS_PENDING = set()
+# version of the cached task statuses, bumped whenever a status is changed locally,
+# a lookup started before that doesn't overwrite the cached status
+TASK_STATUS_VERSIONS = dict()
+# number of queued status updates not pushed to shotgun yet, keyed by task id
+TASK_STATUS_UPDATES_PENDING = dict()
+TASK_STATUS_LOCK = threading.Lock()
+
+# confirmed task status updates, pushed to shotgun by a background worker
+TASK_STATUS_UPDATE_QUEUE = Queue.Queue()
+TASK_STATUS_UPDATE_WORKER = dict(thread=None)
+TASK_STATUS_UPDATE_RETRIES = 3
+TASK_STATUS_UPDATE_RETRY_BACKOFF = 2.0
+# seconds the pending status updates are waited for when the process exits
+TASK_STATUS_UPDATE_EXIT_TIMEOUT = 10.0
+# (log level, message) of the background task status threads, logged from the main thread
+TASK_STATUS_MESSAGES = Queue.Queue()
+
+
+class ReadOnlyPreferences(Mapping):
+    """
+    Read-only view of resolved preferences, nested dictionaries are wrapped as well.
+    """
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        if isinstance(value, dict):
+            return ReadOnlyPreferences(value)
+        return value
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+
 class TaskOperations(HookClass):
     """
     Hook called to perform an operation with the
@@ -46,6 +104,12 @@ class TaskOperations(HookClass):
                                 all others     - None
         """
 
+        # report the task status fetches and updates done in the background since the last operation
+        self._log_task_status_messages()
+
+        # warm the task status of the current context, so that the next save doesn't wait on shotgun
+        self.prefetch_task_status(self.parent.context)
+
         if operation == "open":
             self.update_task_status(context)
             # handle status updates, and show a pop-up for user confirmation to switch the task status.
@@ -58,29 +122,228 @@ class TaskOperations(HookClass):
         elif operation == "save_as":
             self.update_task_status(context)
 
-    def update_task_status(self, context, **kwargs):
+    def get_preferences(self, pref_file_name, fields):
         """
-        Method to update the task entity status.
+        Returns the preferences resolved for the DD environment (show...), and the role, sequence and shot in fields.
+        The preferences are resolved once per process, and resolved again after PREFERENCES_CACHE_TTL seconds.
+
+        :param pref_file_name:  Name of the preference file, eg. show_preferences.yaml
+        :param fields:          Template fields of the context
+        :returns:               ReadOnlyPreferences
+        """
+        environment = tuple(sorted((key, value) for key, value in os.environ.iteritems() if key.startswith("DD_")))
+        cache_key = (pref_file_name, environment, fields.get("Step"), fields.get("Sequence"), fields.get("Shot"))
+
+        cached = PREFERENCES_CACHE.get(cache_key)
+        if cached:
+            resolve_time, prefs = cached
+            if time.time() - resolve_time < PREFERENCES_CACHE_TTL:
+                return prefs
+
+        # only the engines resolving preferences need the preferences package
+        from dd.runtime import api
+        api.load("preferences")
+        import preferences
+
+        resolved_prefs = preferences.Preferences(pref_file_name=pref_file_name,
+                                                 role=cache_key[2],
+                                                 seq_override=cache_key[3],
+                                                 shot_override=cache_key[4])
+        prefs = ReadOnlyPreferences(resolved_prefs)
+        PREFERENCES_CACHE[cache_key] = (time.time(), prefs)
+        return prefs
+
+    def prefetch_task_status(self, context, refresh=False):
+        """
+        Fetches the status of the context task in a background thread, if it isn't cached or being fetched.
 
         :param context: Source for the task entity.
+        :param refresh: Fetch the status again even if it is cached.
+        """
+        if not context or not context.task:
+            return
+
+        task_id = context.task["id"]
+        with TASK_STATUS_LOCK:
+            if (task_id in TASK_STATUS_CACHE and not refresh) or task_id in TASK_STATUS_PENDING:
+                return
+            # the cached status of a task with an update that hasn't been pushed yet is the most recent one
+            if TASK_STATUS_UPDATES_PENDING.get(task_id):
+                return
+            TASK_STATUS_PENDING.add(task_id)
+
+        thread = threading.Thread(target=self._fetch_task_status, args=(context,))
+        thread.daemon = True
+        thread.start()
+
+    def _fetch_task_status(self, context):
         """
+        Fetches the status of the context task from shotgun, and caches it.
+        The fetched status isn't cached if the status was changed locally in the meantime.
+
+        :param context: Source for the task entity.
+        :returns: Status of the task, None if the task couldn't be found.
+        """
+        task_id = context.task["id"]
+        with TASK_STATUS_LOCK:
+            status_version = TASK_STATUS_VERSIONS.get(task_id, 0)
 
         sg_filters = [
             ["project", "is", context.project],
-            ["id", "is", context.task["id"]]
+            ["id", "is", task_id]
         ]
 
+        try:
+            # the shotgun connection is per thread
+            task_entity = self.parent.shotgun.find_one("Task", sg_filters, fields=["sg_status_list"])
+        except Exception:
+            # this may run in the prefetch thread, the message is logged from the main thread
+            TASK_STATUS_MESSAGES.put(("warning", "Failed to fetch the status of task '%s'." % context.task["name"]))
+            task_entity = None
+        finally:
+            with TASK_STATUS_LOCK:
+                TASK_STATUS_PENDING.discard(task_id)
+
+        if not task_entity:
+            return None
+
+        with TASK_STATUS_LOCK:
+            if TASK_STATUS_VERSIONS.get(task_id, 0) != status_version or TASK_STATUS_UPDATES_PENDING.get(task_id):
+                return TASK_STATUS_CACHE.get(task_id)
+            TASK_STATUS_CACHE[task_id] = task_entity["sg_status_list"]
+        return task_entity["sg_status_list"]
+
+    def _queue_task_status_update(self, context, current_task_status, new_task_status):
+        """
+        Queues a confirmed task status update, the update is pushed to shotgun by a background worker.
+        The cached status is updated right away.
+
+        :param context: Source for the task entity.
+        :param current_task_status: Status the task is updated from.
+        :param new_task_status: Status the task is updated to.
+        """
+        task_id = context.task["id"]
+        with TASK_STATUS_LOCK:
+            TASK_STATUS_CACHE[task_id] = new_task_status
+            TASK_STATUS_VERSIONS[task_id] = TASK_STATUS_VERSIONS.get(task_id, 0) + 1
+            TASK_STATUS_UPDATES_PENDING[task_id] = TASK_STATUS_UPDATES_PENDING.get(task_id, 0) + 1
+
+            worker = TASK_STATUS_UPDATE_WORKER["thread"]
+            if not worker or not worker.is_alive():
+                if not worker:
+                    # the worker is a daemon, the pending updates are flushed when the process exits
+                    atexit.register(self._flush_task_status_updates)
+                worker = threading.Thread(target=self._process_task_status_updates)
+                worker.daemon = True
+                worker.start()
+                TASK_STATUS_UPDATE_WORKER["thread"] = worker
+
+        TASK_STATUS_UPDATE_QUEUE.put((context, current_task_status, new_task_status))
+
+    def _process_task_status_updates(self):
+        """
+        Background worker pushing the queued task status updates to shotgun, with retries.
+        Nothing is logged from this thread, the results are logged from the main thread.
+        """
+        while True:
+            context, current_task_status, new_task_status = TASK_STATUS_UPDATE_QUEUE.get()
+            task_name = context.task["name"]
+
+            for attempt in range(1, TASK_STATUS_UPDATE_RETRIES + 1):
+                try:
+                    self.parent.shotgun.update("Task", context.task["id"], {"sg_status_list": new_task_status})
+                    TASK_STATUS_MESSAGES.put(("info", "Updated status for task '%s' from %s to %s." % (
+                        task_name, current_task_status, new_task_status)))
+                    break
+                except Exception:
+                    if attempt < TASK_STATUS_UPDATE_RETRIES:
+                        time.sleep(TASK_STATUS_UPDATE_RETRY_BACKOFF ** attempt)
+            else:
+                TASK_STATUS_MESSAGES.put(("warning", "Failed to update status for task '%s' from %s to %s." % (
+                    task_name, current_task_status, new_task_status)))
+                # the cached status can't be trusted anymore
+                with TASK_STATUS_LOCK:
+                    TASK_STATUS_CACHE.pop(context.task["id"], None)
+                    TASK_STATUS_VERSIONS[context.task["id"]] = TASK_STATUS_VERSIONS.get(context.task["id"], 0) + 1
+
+            with TASK_STATUS_LOCK:
+                TASK_STATUS_UPDATES_PENDING[context.task["id"]] -= 1
+
+            TASK_STATUS_UPDATE_QUEUE.task_done()
+
+    def _log_task_status_messages(self):
+        """
+        Logs the messages of the background task status threads, from the calling thread.
+        """
+        while True:
+            try:
+                level, message = TASK_STATUS_MESSAGES.get_nowait()
+            except Queue.Empty:
+                break
+            getattr(self.parent.logger, level)(message)
+
+    def _flush_task_status_updates(self):
+        """
+        Waits, for TASK_STATUS_UPDATE_EXIT_TIMEOUT seconds at most, for the queued status updates to be pushed.
+        Called when the process exits, the updates that couldn't be pushed in time are logged as dropped.
+        """
+        deadline = time.time() + TASK_STATUS_UPDATE_EXIT_TIMEOUT
+        while time.time() < deadline:
+            with TASK_STATUS_LOCK:
+                if not any(TASK_STATUS_UPDATES_PENDING.itervalues()):
+                    break
+            time.sleep(0.1)
+
+        self._log_task_status_messages()
+
+        while True:
+            try:
+                context, current_task_status, new_task_status = TASK_STATUS_UPDATE_QUEUE.get_nowait()
+            except Queue.Empty:
+                break
+            self.parent.logger.warning("Dropped status update for task '%s' from %s to %s.", context.task["name"],
+                                       current_task_status, new_task_status)
+
+    def update_task_status(self, context, **kwargs):
+        """
+        Method to update the task entity status.
+        The status is read from the cache when possible, and the confirmed update is pushed in the background.
+        A cached status is refreshed in the background once the user answered, for the next operation.
+
+        :param context: Source for the task entity.
+        """
+        with TASK_STATUS_LOCK:
+            cached = context.task["id"] in TASK_STATUS_CACHE
+
+        try:
+            return self._update_task_status(context)
+        finally:
+            if cached:
+                self.prefetch_task_status(context, refresh=True)
+            self._log_task_status_messages()
+
+    def _update_task_status(self, context):
+        """
+        Confirms the task status update with the user, and queues it.
+
+        :param context: Source for the task entity.
+        """
+
         task_status_update_mapping = self.parent.settings["task_status_updates"]
 
-        task_entity = self.parent.shotgun.find_one("Task", sg_filters, fields=["sg_status_list"])
-        current_task_status = task_entity["sg_status_list"]
+        with TASK_STATUS_LOCK:
+            current_task_status = TASK_STATUS_CACHE.get(context.task["id"])
+
+        if current_task_status is None:
+            # not fetched yet, this is the only time we wait on shotgun
+            current_task_status = self._fetch_task_status(context)
         task_name = context.task["name"]
 
         new_status_list = list(set([new_status for new_status,
                                                    existing_status_list in task_status_update_mapping.iteritems()
                                     if current_task_status in existing_status_list]))
 
-        if task_entity and len(new_status_list) == 1:
+        if current_task_status and len(new_status_list) == 1:
             # we found the new status for the task, confirm with user before updating.
             new_task_status = new_status_list[0]
             res = QtGui.QMessageBox.question(None,
@@ -90,20 +353,14 @@ class TaskOperations(HookClass):
                                              QtGui.QMessageBox.Yes | QtGui.QMessageBox.No)
 
             if res == QtGui.QMessageBox.Yes:
-                try:
-                    self.parent.shotgun.update("Task", context.task["id"], {"sg_status_list": new_task_status})
-                    self.parent.logger.info("Updated status for task '%s' from %s to %s.", task_name,
-                                            current_task_status, new_task_status)
-                except:
-                    self.parent.logger.warning("Failed to update status for task '%s' from %s to %s.", task_name,
-                                               current_task_status, new_task_status)
+                self._queue_task_status_update(context, current_task_status, new_task_status)
             else:
                 self.parent.logger.info("User denied to update status for task '%s' from %s to %s.", task_name,
                                         current_task_status, new_task_status)
 
             return True
 
-        elif task_entity and len(new_status_list) > 1:
+        elif current_task_status and len(new_status_list) > 1:
             # there is something wrong with the configuration, we shouldn't have two new statuses.
             self.parent.logger.error("Multiple new statuses found: %s. Please contact your TD.", new_status_list)
             return False